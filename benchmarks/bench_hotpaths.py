@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+#
+# Microbenchmarks for the pure functions on the check hot paths.
+#
+#   python3 benchmarks/bench_hotpaths.py -o baseline.json
+#   (change things)
+#   python3 benchmarks/bench_hotpaths.py -o current.json
+#   python3 benchmarks/compare.py baseline.json current.json --threshold 10
+#
+# All inputs are fixed: the certificates in corpus/ and DNS answers and
+# DNSKEY sets built deterministically below.
+
+import os
+import sys
+import random
+import struct
+import hashlib
+import logging
+import argparse
+from calendar import timegm
+from datetime import datetime
+
+import pyperf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from unbound import ub_data, RR_TYPE_A, RR_TYPE_AAAA
+
+from check_dane.cert import get_spki, verify_certificate, certificate_expiry, fingerprint
+from check_dane.tlsa import TLSARecord, match_tlsa_records, RR_TYPE_TLSA
+from check_dane.resolve import _parse_rrsig_date, format_address, rrsig_expiration
+from check_dane.resolve import dnssec_verify_rrsig_validity, _srv_records
+from check_dane.schedule import Scheduler, CheckState, hash_records
+from check_dane.dnssec import _keytag
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+CERTIFICATES = ['rsa2048', 'rsa4096', 'ecdsa256', 'ecdsa384']
+
+RR_TYPE_RRSIG = 46
+RR_TYPE_DNSKEY = 48
+
+
+def load_certificate(name):
+    with open(os.path.join(CORPUS, "%s.der" % name), "rb") as derfile:
+        return derfile.read()
+
+
+def tlsa_rrset(certificate, size):
+    """size records, the last one matching certificate via SPKI / SHA-256
+       like most deployed 3 1 1 records"""
+    rng = random.Random(size)
+    records = []
+    for i in range(size - 1):
+        selector = i % 2
+        matching = 1 + i % 2
+        payload = bytes(rng.getrandbits(8) for _ in range(32 if matching == 1 else 64))
+        records.append(TLSARecord(3, selector, matching, payload))
+
+    spki = get_spki.__wrapped__(certificate)
+    records.append(TLSARecord(3, 1, 1, hashlib.sha256(spki).digest()))
+    return set(records)
+
+
+def _wire_name(name):
+    return b"".join(struct.pack("B", len(label)) + label.encode()
+                    for label in name.split(".")) + b"\x00"
+
+
+def answer_packet(name, rrtype, rdatas, signatures=1):
+    """DNS answer for name carrying rdatas and signatures RRSIGs over them"""
+    rng = random.Random(len(rdatas) * 100 + signatures)
+    packet = struct.pack("!HHHHHH", 0, 0x8180, 1, len(rdatas) + signatures, 0, 0)
+    packet += _wire_name(name) + struct.pack("!HH", rrtype, 1)
+
+    for rdata in rdatas:
+        packet += struct.pack("!HHHIH", 0xc00c, rrtype, 1, 3600, len(rdata)) + rdata
+
+    # valid from the past until well within the serial number arithmetic
+    # window, so validity checks take their full path
+    inception = timegm(datetime(2020, 1, 1).utctimetuple())
+    expiration = timegm(datetime(2080, 1, 1).utctimetuple())
+    for i in range(signatures):
+        rdata = struct.pack("!HBBIIIH", rrtype, 13, name.count(".") + 1, 3600,
+                            expiration + i * 86400, inception, rng.getrandbits(16))
+        rdata += _wire_name("example.org")
+        rdata += bytes(rng.getrandbits(8) for _ in range(64))
+        packet += struct.pack("!HHHIH", 0xc00c, RR_TYPE_RRSIG, 1, 3600, len(rdata)) + rdata
+
+    return packet
+
+
+def dnskey_set(size):
+    rng = random.Random(size)
+    keys = []
+    for i in range(size):
+        flags = 257 if i == 0 else 256
+        algorithm = 8 if i % 2 else 13
+        key = bytes(rng.getrandbits(8) for _ in range(260 if algorithm == 8 else 64))
+        keys.append(struct.pack("!HBB", flags, 3, algorithm) + key)
+    return keys
+
+
+class SRVAnswer:
+    def __init__(self, count):
+        raw = [struct.pack("!HHH", 5, 0, 5222 + i) + _wire_name("xmpp%d.example.org" % i)
+               for i in range(count)]
+        self.data = ub_data(raw)
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    runner = pyperf.Runner()
+
+    certificates = {name: load_certificate(name) for name in CERTIFICATES}
+    args = argparse.Namespace(warndays=30, critdays=7)
+    info = {'notBefore': 'Jan  1 00:00:00 2025 GMT', 'notAfter': 'Jan  1 00:00:00 2035 GMT'}
+
+    for name, certificate in certificates.items():
+        runner.bench_func("get_spki[%s]" % name, get_spki.__wrapped__, certificate)
+        runner.bench_func("get_spki_cached[%s]" % name, get_spki, certificate)
+        runner.bench_func("fingerprint[%s]" % name, fingerprint, certificate)
+
+        record = TLSARecord(3, 1, 1, hashlib.sha256(get_spki(certificate)).digest())
+        runner.bench_func("TLSARecord.match[3 1 1,%s]" % name, record.match, certificate)
+
+    certificate = certificates['rsa2048']
+    spki = get_spki(certificate)
+    for selector, matching in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)]:
+        data = certificate if selector == 0 else spki
+        payload = [data, hashlib.sha256(data).digest(), hashlib.sha512(data).digest()][matching]
+        record = TLSARecord(3, selector, matching, payload)
+        runner.bench_func("TLSARecord.match[3 %d %d]" % (selector, matching), record.match, certificate)
+
+    for size in [1, 4, 16]:
+        records = tlsa_rrset(certificate, size)
+        runner.bench_func("match_tlsa_records[%d records,1 cert]" % size,
+                          match_tlsa_records, records, [certificate])
+        runner.bench_func("match_tlsa_records[%d records,4 certs]" % size,
+                          match_tlsa_records, records, list(certificates.values()))
+        runner.bench_func("hash_records[%d records]" % size, hash_records, records)
+
+    runner.bench_func("verify_certificate", verify_certificate, info, args)
+    runner.bench_func("certificate_expiry", certificate_expiry, info)
+
+    runner.bench_func("_parse_rrsig_date", _parse_rrsig_date, "20300115000000")
+
+    runner.bench_func("format_address[A]", format_address, bytes([192, 0, 2, 1]), RR_TYPE_A)
+    runner.bench_func("format_address[AAAA]", format_address,
+                      bytes.fromhex("20010db8000000000000000000000001"), RR_TYPE_AAAA)
+
+    for count in [1, 8]:
+        runner.bench_func("_srv_records[%d]" % count, _srv_records, SRVAnswer(count))
+
+    tlsa = [bytes([3, 1, 1]) + bytes([i]) * 32 for i in range(4)]
+    for signatures in [1, 2]:
+        packet = answer_packet("_443._tcp.example.org", RR_TYPE_TLSA, tlsa, signatures)
+        runner.bench_func("rrsig_expiration[%d sigs]" % signatures, rrsig_expiration, packet)
+        runner.bench_func("dnssec_verify_rrsig_validity[%d sigs]" % signatures,
+                          dnssec_verify_rrsig_validity, packet, 30, 7)
+
+    for size in [2, 4]:
+        keys = dnskey_set(size)
+        runner.bench_func("_keytag[%d keys]" % size, lambda keys: [_keytag(key) for key in keys], keys)
+        packet = answer_packet("example.org", RR_TYPE_DNSKEY, keys)
+        runner.bench_func("rrsig_expiration[DNSKEY %d keys]" % size, rrsig_expiration, packet)
+
+    scheduler = Scheduler(":memory:", 300, 86400, 30, 7)
+    state = CheckState(status=0, checked=1e9, tlsa_hash="", tlsa_ttl=3600, fingerprints=[],
+                       cert_expire=1e9 + 90 * 86400, rrsig_expire=1e9 + 14 * 86400,
+                       tlsa_checked=1e9)
+    runner.bench_func("Scheduler.next_check", scheduler.next_check, state)
+
+
+if __name__ == '__main__':
+    main()
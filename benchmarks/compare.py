@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+#
+# Compares two result files of bench_hotpaths.py and fails if any
+# benchmark got slower than the threshold.
+
+import sys
+import argparse
+
+import pyperf
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("Baseline", help="pyperf result file of the reference run")
+    parser.add_argument("Current", help="pyperf result file of the run to check")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="Percent a benchmark may be slower before failing (default: 10)")
+
+    args = parser.parse_args()
+
+    baseline = {bench.get_name(): bench for bench in
+                pyperf.BenchmarkSuite.load(args.Baseline).get_benchmarks()}
+    current = pyperf.BenchmarkSuite.load(args.Current)
+
+    retval = 0
+    for bench in current.get_benchmarks():
+        name = bench.get_name()
+        if name not in baseline:
+            print("%-50s new" % name)
+            continue
+
+        change = (bench.mean() / baseline[name].mean() - 1) * 100
+        if change > args.threshold:
+            print("%-50s %+7.1f%%  REGRESSION" % (name, change))
+            retval = 1
+        else:
+            print("%-50s %+7.1f%%" % (name, change))
+
+    return retval
+
+
+if __name__ == '__main__':
+    sys.exit(main())
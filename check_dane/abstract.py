@@ -1,10 +1,23 @@
+import time
+import asyncio
+import logging
 from abc import ABC, abstractmethod
 from socket import AF_INET6, AF_INET
 
-from unbound import ub_ctx
+from check_dane.cert import PeerCertificate, fingerprint, verify_certificate, certificate_expiry
+from check_dane.tlsa import get_tlsa_rrset_async, match_tlsa_records
+from check_dane.schedule import Scheduler, CheckState, hash_records, add_schedule_options
+from check_dane.resolve import AsyncResolver, create_context, address_lookup_async
+from check_dane.history import History, add_history_options
 
-from check_dane.cert import verify_certificate
-from check_dane.tlsa import get_tlsa_records, match_tlsa_records
+
+async def close_stream(writer):
+    """Closes a stream, ignoring peers that don't shut down TLS cleanly"""
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
 
 
 class DaneWarning:
@@ -15,17 +28,28 @@ class DaneError:
 
 
 class DaneChecker(ABC):
-    def __init__(self):
-        pass
+    def __init__(self, resolver=None, sslcontext=None):
+        self._resolver = resolver
+        self._sslcontext = sslcontext
+        self._scheduler = None
+        self._history = None
+        self._rrsets = []
+        self.records = set()
+        self.certificates = dict()
+        self.unused = set()
+        self.tlsa_status = None
+        self.timings = dict()
 
 
     @abstractmethod
-    def _init_connection(self, family, host, port):
+    async def _init_connection(self, address, host, port):
+        """Opens a TLS connection to address, verifying the peer as host,
+           and returns the (reader, writer) stream pair"""
         pass
 
 
     @abstractmethod
-    def _close_connection(self, connection):
+    async def _close_connection(self, reader, writer):
         pass
 
 
@@ -35,23 +59,111 @@ class DaneChecker(ABC):
         pass
 
 
-    def _gather_certificates(self):
+    def _services(self):
+        """Returns all (host, port) tuples to check"""
+        return [(self._host, self.port)]
+
+
+    async def _probe(self, address, host, port, certificates):
+        """Adds the certificate served on address to certificates and
+           returns whether connecting succeeded"""
+        try:
+            reader, writer = await asyncio.wait_for(self._init_connection(address, host, port),
+                                                    self._args.timeout)
+        except asyncio.TimeoutError:
+            logging.error("Connecting to %s:%d via %s timed out after %d seconds",
+                          host, port, address, self._args.timeout)
+            return False
+        except (OSError, EOFError) as e:
+            logging.error("Connecting to %s:%d via %s failed: %s", host, port, address, e)
+            return False
+
+        sslobject = writer.get_extra_info('ssl_object')
+        der = sslobject.getpeercert(binary_form=True)
+        endpoint = (host, port, address)
+        key = fingerprint(der)
+
+        if key in certificates:
+            certificates[key].endpoints.append(endpoint)
+        else:
+            certificates[key] = PeerCertificate(der, sslobject.getpeercert(), [endpoint])
+
+        try:
+            await asyncio.wait_for(self._close_connection(reader, writer), self._args.timeout)
+        except (OSError, EOFError) as e:
+            logging.debug("Closing the connection to %s failed: %r", address, e)
+            writer.close()
+
+        return True
+
+
+    async def _gather_certificates(self):
+        """Connects to all addresses of all services concurrently and returns
+           the status of connecting and of verifying the expiry of the
+           certificates and a dict mapping the fingerprint of each distinct
+           certificate to a PeerCertificate listing all (host, port, address)
+           it was served on
+        """
         retval = 0
-        certificates = set()
-        for afamily in self._afamilies:
-            connection = self._init_connection(afamily, self._host, self.port)
+        certificates = dict()
+
+        # addresses are looked up through the validating resolver, which
+        # may already hold them when several checks share it
+        lookups = [(host, port, afamily) for host, port in self._services()
+                   for afamily in self._afamilies]
+        addresses = await asyncio.gather(*[address_lookup_async(host, afamily, self._resolver)
+                                           for host, _, afamily in lookups])
 
-            nretval = verify_certificate(connection.getpeercert(), self._args)
-            retval = max(retval, nretval)
-            certificates.add(connection.getpeercert(binary_form=True))
+        probes = [(address, host, port) for (host, port, _), found in zip(lookups, addresses)
+                  for address in found]
+        if probes == []:
+            logging.error("No address found for %s",
+                          ", ".join(sorted(set(host for host, _, _ in lookups))) or self._host)
+            return 2, certificates
 
-            self._close_connection(connection)
+        # a failing address is reported but doesn't hide the certificates
+        # served on the others
+        connected = await asyncio.gather(*[self._probe(address, host, port, certificates)
+                                           for address, host, port in probes])
+        if not all(connected):
+            retval = 2
 
-        return certificates
+        if self._args.check_expire:
+            for certificate in certificates.values():
+                nretval = verify_certificate(certificate.info, self._args)
+                retval = max(retval, nretval)
 
+        return retval, certificates
 
-    def _gather_records(self):
-        return get_tlsa_records(self._resolver, "_%d._tcp.%s" % (self.port, self._host))
+
+    async def _gather_records(self):
+        result = set()
+        rrsets = await asyncio.gather(*[get_tlsa_rrset_async(self._resolver,
+                                                             "_%d._tcp.%s" % (port, host))
+                                        for host, port in self._services()])
+
+        for rrset in rrsets:
+            if rrset is not None:
+                self._rrsets.append(rrset)
+                result.update(rrset.records)
+
+        return result
+
+
+    @property
+    def _family(self):
+        """The address family the check is restricted to, as target suffix"""
+        if self._args.use6:
+            return " ipv6"
+        elif self._args.use4:
+            return " ipv4"
+        return ""
+
+
+    @property
+    def target(self):
+        """Identifies the checked service in the scheduler state"""
+        return "%s %s:%d%s" % (type(self).__name__, self._host, self.port, self._family)
 
 
     def generate_menu(self, argparser):
@@ -74,16 +186,21 @@ class DaneChecker(ABC):
                                default="/etc/ssl/certs/ca-certificates.crt",
                                help="ca certificate bundle")
 
+        argparser.add_argument("--timeout", type=int, default=30,
+                               help="Seconds to wait for connecting to each address and the TLS handshake")
+
         group = argparser.add_mutually_exclusive_group()
         group.add_argument("-6", "--6", action="store_true", dest="use6", help="check via IPv6 only")
         group.add_argument("-4", "--4", action="store_true", dest="use4", help="check via IPv4 only")
 
+        add_schedule_options(argparser)
+        add_history_options(argparser)
+
 
     def set_args(self, args):
         self._args = args
-        resolver = ub_ctx()
-        resolver.add_ta_file(args.ancor)
-        self._resolver = resolver
+        if self._resolver is None:
+            self._resolver = AsyncResolver(create_context(args.ancor))
 
         if args.use6:
             self._afamilies = [AF_INET6]
@@ -94,8 +211,117 @@ class DaneChecker(ABC):
 
         self._host = args.Host.encode('idna').decode()
 
+        if args.state is not None:
+            self._scheduler = Scheduler(args.state, args.min_interval, args.max_interval,
+                                        args.warndays, args.critdays)
+
+        if args.history is not None:
+            self._history = History(args.history)
+
+
+    @property
+    def cert_expire(self):
+        """Earliest expiry of all certificates seen in the last check"""
+        return min([certificate_expiry(cert.info) for cert in self.certificates.values()],
+                   default=None)
+
+
+    @property
+    def rrsig_expire(self):
+        """Earliest signature expiry of all TLSA RRsets seen in the last check"""
+        return min([rrset.expires for rrset in self._rrsets if rrset.expires is not None],
+                   default=None)
+
+
+    def _record_state(self, status, checked, records, certificates):
+        ttls = [rrset.ttl for rrset in self._rrsets if rrset.ttl is not None]
+
+        state = CheckState(status=status,
+                           checked=checked,
+                           tlsa_hash=hash_records(records),
+                           tlsa_ttl=min(ttls, default=None),
+                           fingerprints=sorted(key.hex() for key in certificates),
+                           cert_expire=self.cert_expire,
+                           rrsig_expire=self.rrsig_expire,
+                           tlsa_checked=checked)
+
+        previous = self._scheduler.lookup(self.target)
+        if previous is not None:
+            if previous.tlsa_hash != state.tlsa_hash:
+                logging.info("TLSA records changed since last full check")
+            if previous.fingerprints != state.fingerprints:
+                logging.info("Certificates changed since last full check")
+
+        self._scheduler.update(self.target, state)
+
+
+    async def _recheck_records(self, state):
+        """Queries only the TLSA records again and returns whether they are
+           unchanged since the last full check"""
+        checked = time.time()
+        self._rrsets = []
+        records = await self._gather_records()
+
+        if hash_records(records) != state.tlsa_hash:
+            logging.info("TLSA records changed since last full check")
+            return False
+
+        ttls = [rrset.ttl for rrset in self._rrsets if rrset.ttl is not None]
+        self._scheduler.update(self.target, state._replace(tlsa_checked=checked,
+                                                           tlsa_ttl=min(ttls, default=None),
+                                                           rrsig_expire=self.rrsig_expire))
+        return True
+
+
+    async def _timed(self, phase, coroutine):
+        start = time.monotonic()
+        try:
+            return await coroutine
+        finally:
+            self.timings[phase] = time.monotonic() - start
+
+
+    async def check_async(self):
+        """Runs the check, afterwards the TLSA records and certificates
+           seen, the unused records, the status of matching them and the
+           duration of each phase are available as attributes.
+
+           With a scheduler, the last result is reused until a full check
+           is due. Only the TLSA records are queried again once their TTL
+           expired, a change of them forces a full check."""
+        if self._scheduler is not None and not self._scheduler.due(self.target):
+            state = self._scheduler.lookup(self.target)
+            if not self._scheduler.tlsa_due(self.target) or await self._recheck_records(state):
+                logging.info("Reusing last result, next full check due at %s",
+                             time.strftime("%Y-%m-%d %H:%M:%S",
+                                           time.gmtime(self._scheduler.next_check(state))))
+                return state.status
+
+        checked = time.time()
+        self._rrsets = []
+        self.timings = dict()
+        records, (result, certificates) = await self._timed('total', asyncio.gather(
+            self._timed('dns', self._gather_records()),
+            self._timed('handshake', self._gather_certificates())))
+
+        usedrecords = set()
+        self.tlsa_status = match_tlsa_records(records, [cert.der for cert in certificates.values()],
+                                              usedrecords)
+        result = max(result, self.tlsa_status)
+
+        self.records = records
+        self.certificates = certificates
+        self.unused = records - usedrecords
+
+        if self._scheduler is not None:
+            self._record_state(result, checked, records, certificates)
+
+        if self._history is not None:
+            self._history.append(self.target, result, self.cert_expire, self.rrsig_expire,
+                                 list(certificates), checked)
+
+        return result
+
 
     def check(self):
-        records = self._gather_records()
-        certificates = self._gather_certificates()
-        return match_tlsa_records(records, certificates)
+        return asyncio.run(self.check_async())
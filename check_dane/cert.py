@@ -1,14 +1,27 @@
 #!/usr/bin/python3
 
+from collections import namedtuple
 from datetime import datetime
+from functools import lru_cache
+from hashlib import sha256
 import logging
-from ssl import cert_time_to_seconds
+from ssl import SSLContext, PROTOCOL_TLSv1_2, CERT_REQUIRED, cert_time_to_seconds
 
 from pyasn1_modules import rfc2459
 from pyasn1.codec.der import decoder, encoder
 
+PeerCertificate = namedtuple('PeerCertificate', ['der', 'info', 'endpoints'])
+
+def fingerprint(certificate):
+    """Returns the sha256 fingerprint of a DER encoded certificate"""
+    return sha256(certificate).digest()
+
+def certificate_expiry(cert):
+    """Returns the expiry of a decoded certificate as unix timestamp"""
+    return cert_time_to_seconds(cert['notAfter'])
+
 def verify_certificate(cert, args):
-    expiretimestamp = cert_time_to_seconds(cert['notAfter'])
+    expiretimestamp = certificate_expiry(cert)
     starttimestamp = cert_time_to_seconds(cert['notBefore'])
 
     if datetime.utcfromtimestamp(starttimestamp) > datetime.utcnow():
@@ -31,11 +44,18 @@ def verify_certificate(cert, args):
 
     return 0
 
+@lru_cache(maxsize=256)
 def get_spki(certificate):
     cert = decoder.decode(certificate, asn1Spec=rfc2459.Certificate())[0]
     spki = cert['tbsCertificate']["subjectPublicKeyInfo"]
     return encoder.encode(spki)
 
+def create_sslcontext(castore):
+    sslcontext = SSLContext(PROTOCOL_TLSv1_2)
+    sslcontext.verify_mode = CERT_REQUIRED
+    sslcontext.load_verify_locations(castore)
+    return sslcontext
+
 def add_certificate_options(argparser):
     argparser.add_argument("--warndays", type=int, default=-1,
                            help="Days before certificate expiration to warn")
@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+
+from __future__ import print_function
+
+import sys
+import argparse
+import logging
+import hashlib
+import codecs
+import struct
+from collections import namedtuple
+from pprint import pprint
+from hashlib import sha256
+
+from unbound import RR_TYPE_SOA, RR_TYPE_DNSKEY, RR_TYPE_NS
+from unbound import RR_TYPE_A, RR_TYPE_AAAA, RR_TYPE_DS
+from ldns import LDNS_SECTION_ANSWER
+from ldns import ldns_wire2pkt
+
+
+from check_dane.resolve import Resolver, ResolverException
+from check_dane.resolve import format_address, dnssec_verify_rrsig_validity, rrsig_expiration
+
+
+DSRecord = namedtuple('DSRecord', ['keytag', 'algorithm', 'digesttype', 'digest'])
+DNSKEYRecord = namedtuple('DNSKEYRecord', ['flags', 'protocol', 'algorithm', 'key', 'digest'])
+ZoneState = namedtuple('ZoneState', ['status', 'serials', 'rrsig_expire'])
+
+
+def _keytag(data):
+    """Returns the key tag of a DNSKEY record's RDATA (RFC 4034 appendix B)"""
+    # RSA/MD5 keys use the low bits of the modulus instead of a checksum
+    if data[3] == 1:
+        return (data[-3] << 8) | data[-2]
+
+    keytag = 0
+
+    for i in range(0, len(data) - 1, 2):
+        keytag = keytag + data[i + 1] + 256 * data[i]
+
+    if len(data) % 2 == 1:
+        keytag = keytag + 256 * data[-1]
+
+    keytag = keytag + ((keytag >> 16) & 0xFFFF)
+    return keytag & 0xFFFF
+
+
+def check_main_records(resolver, zone, args, expires=None):
+    """Confirms that the necessary records on a zone all verify. If given,
+       the earliest signature expiry of each record is added to expires"""
+    retval = 0
+
+    for rrtype in [RR_TYPE_DNSKEY, RR_TYPE_NS, RR_TYPE_SOA]:
+        result = resolver.resolve(zone, rrtype=rrtype, secure=True)
+        nretval = dnssec_verify_rrsig_validity(result.packet, args.warndays, args.critdays)
+        retval = max(nretval, retval)
+
+        if expires is not None:
+            expire = rrsig_expiration(result.packet)
+            if expire is not None:
+                expires.append(expire)
+
+    return retval
+
+
+def check_ds_delegation(resolver, zone, args):
+    retval = 0
+    try:
+        dses = dict()
+        result = resolver.resolve(zone, RR_TYPE_DS, secure=True)
+
+        for entry in result.data.data:
+            tag, algo, digest = struct.unpack("!HBB", entry[:4])
+            value = entry[4:]
+            dses[tag] = DSRecord(tag, algo, digest, value)
+
+        dnskeys = dict()
+        result = resolver.resolve(zone, RR_TYPE_DNSKEY, secure=True)
+
+        for entry in result.data.data:
+            flags, protocol, algorithm = struct.unpack("!HBB", entry[:4])
+            value = entry[4:]
+            digest = sha256()
+            # owner name in canonical wire format
+            for label in zone.lower().rstrip('.').split('.'):
+                digest.update(struct.pack('b', len(label)))
+                digest.update(label.encode())
+            digest.update(struct.pack('b', 0))
+            digest.update(entry)
+            if flags & 0x1 == 1 and (flags >> 7) & 0x1 == 0:
+                dnskeys[_keytag(entry)] = DNSKEYRecord(flags, protocol, algorithm, value,digest.digest())
+
+        for key in dnskeys:
+            dnskey = dnskeys[key]
+            if not key in dses:
+                logging.warn("No DS record found for %s", dnskey)
+                retval = max(retval, 1)
+
+            else:
+                ds = dses[key]
+                if ds.digest != dnskey.digest:
+                    logging.error("DS and DNSKEY do not match: %s %s", ds, dnskey)
+                    retval = 2
+
+        for ds in dses:
+            if not ds in dnskeys:
+                logging.warn("Unused DS record: %s", dses[ds])
+                retval = max(retval, 1)
+
+        return retval
+
+    except ResolverException as e:
+        logging.exception("check_ds_delegation: %s", e.message)
+        return 2
+
+
+def check_nsec_cycle(resolver, zone, args):
+    """Confirms that NSEC records are completely available"""
+    return 0
+
+
+def get_soa_serials(resolver, zone, args):
+    """Returns a dict mapping every SOA serial served for the zone to the
+       addresses of the authoritative nameservers serving it or None if
+       the nameservers could not be queried
+    """
+    result = resolver.resolve(zone, RR_TYPE_NS, secure=True)
+
+    if result.data is None:
+        logging.error("No nameservers found for zone %s", zone)
+        return None
+
+    nameservers = result.data.as_domain_list()
+    nameserver_ips = []
+    for nameserver in nameservers:
+        ips = []
+        for rrtype in [RR_TYPE_AAAA, RR_TYPE_A]:
+            result = resolver.resolve(nameserver, rrtype=rrtype, secure=True)
+            if result.data is not None:
+                ips = ips + [format_address(data, rrtype) for data in result.data.data]
+
+        if ips == []:
+            logging.warning("Could not find any address for nameserver %s", nameserver)
+
+        nameserver_ips = nameserver_ips + ips
+
+    if nameserver_ips == []:
+        logging.error("No authoritive nameserver for %s could be resolved", zone)
+        return None
+
+    results = dict()
+    for ip in nameserver_ips:
+        newresolver = Resolver(args.ancor, ip)
+
+        # We can't request secure here as the authoritative
+        # nameservers for the zone won't let us retrieve the
+        # signature chain below their own zone. We'll later
+        # recheck the SOA record using the main recursor
+        #
+        # Alternatively one could get the DS / DNSKEY for the zone with
+        # resolver and add it to newresolver as a hint.
+        result = newresolver.resolve(zone, rrtype=RR_TYPE_SOA)
+
+        s, result = ldns_wire2pkt(result.packet)
+        if s != 0:
+            logging.error("Parsing packet failed with errorcode %d", s)
+            return None
+
+        rrs = result.rr_list_by_type(RR_TYPE_SOA, LDNS_SECTION_ANSWER).rrs()
+        soa = next(rrs)
+
+        serial = str(soa).split()[6]
+        results[serial] = results.get(serial, []) + [ip]
+
+    return results
+
+
+def _check_serials(results):
+    if results is None:
+        return 2
+
+    if len(results) == 1:
+        return 0
+    else:
+        logging.error("different SOAs: %s", results)
+        return 2
+
+
+def check_synced(resolver, zone, args):
+    """Makes sure the zone is at the same serial on all secondaries"""
+    try:
+        return _check_serials(get_soa_serials(resolver, zone, args))
+
+    except ResolverException as e:
+        logging.exception("check_synced: %s", e.message)
+        return 2
+
+
+def generate_menu(argparser):
+    argparser.add_argument("Zone")
+
+    argparser.add_argument("-a", "--ancor",
+                           action="store", type=str, default="/etc/unbound/root.key",
+                           help="DNSSEC root ancor")
+
+    argparser.add_argument("--nsec", action="store_false",
+                           help="Verifies the complete NSEC/NSEC3 cycle (default: false)")
+    argparser.add_argument("--warndays", type=int, default=-1,
+                           help="Days before rrsig expiration to warn")
+    argparser.add_argument("--critdays", type=int, default=-1,
+                           help="Days before rrsig expiration to raise error")
+
+
+def check_zone(resolver, args):
+    """Runs all checks on a zone in one pass and returns the status together
+       with the SOA serials and the earliest signature expiry seen"""
+    zone = args.Zone.encode('idna').decode()
+
+    try:
+        serials = get_soa_serials(resolver, zone, args)
+    except ResolverException as e:
+        logging.exception("get_soa_serials: %s", e.message)
+        serials = None
+
+    expires = []
+    retvals = [_check_serials(serials),
+               check_main_records(resolver, zone, args, expires),
+               check_ds_delegation(resolver, zone, args)]
+    if args.nsec:
+        retvals.append(check_nsec_cycle(resolver, zone, args))
+
+    return ZoneState(max(retvals), serials, min(expires, default=None))
+
+
+def check(resolver, args):
+    return check_zone(resolver, args).status
+
+
+def main():
+    logging.basicConfig(format='%(levelname)5s %(message)s')
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+
+    generate_menu(parser)
+
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    else:
+        logging.getLogger().setLevel(logging.INFO)
+
+    resolver = Resolver(args.ancor)
+    return check(resolver, args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+
+import sys
+import asyncio
+import logging
+import argparse
+
+from unbound import RR_TYPE_A, RR_TYPE_AAAA, RR_TYPE_SOA, RR_TYPE_NS
+from unbound import RR_TYPE_DNSKEY, RR_TYPE_DS
+
+from check_dane import dnssec, ssh
+from check_dane.cert import add_certificate_options, create_sslcontext
+from check_dane.tlsa import RR_TYPE_TLSA
+from check_dane.ssh import RR_TYPE_SSHFP
+from check_dane.xmpp import XmppDaneChecker
+from check_dane.fleet import CHECKERS, STATES, Target, parse_target
+from check_dane.resolve import Resolver, ResolverException, CachingAsyncResolver, create_context
+from check_dane.resolve import srv_lookup_async, mx_lookup_async
+
+
+SERVICES = ['https', 'smtp', 'xmpp', 'ssh', 'dnssec']
+
+
+async def _nothing():
+    return []
+
+
+def service_options(protocol, args):
+    """Returns the command line options for checking a service of the domain"""
+    options = ["--ancor", args.ancor]
+    if protocol in CHECKERS:
+        options += ["--castore", args.castore]
+        if args.use4:
+            options.append("-4")
+        elif args.use6:
+            options.append("-6")
+    # negative values would be mistaken for options
+    if protocol != 'ssh':
+        options += ["--warndays=%d" % args.warndays, "--critdays=%d" % args.critdays]
+    return options
+
+
+class DomainChecker:
+    """Checks all DANE relevant services of a domain, sharing one validating
+       resolver and one deduplicated batch of lookups between them"""
+    def __init__(self, args):
+        self._args = args
+        self._domain = args.Domain.encode('idna').decode()
+
+        # the DNSSEC and SSH checks use synchronous lookups on the same
+        # context, sharing its cache with the prefetched answers
+        context = create_context(args.ancor)
+        self._resolver = CachingAsyncResolver(context)
+        self._sresolver = Resolver(args.ancor, context=context)
+        self._sslcontext = create_sslcontext(args.castore)
+
+
+    async def _has_data(self, name, rrtype):
+        _, result = await self._resolver.resolve(name, rrtype)
+        return result is not None and result.data is not None
+
+
+    async def _prefetch(self, queries):
+        await asyncio.gather(*[self._resolver.resolve(name, rrtype) for name, rrtype in queries])
+
+
+    async def _nameservers(self):
+        _, result = await self._resolver.resolve(self._domain, RR_TYPE_NS)
+        if result is None or result.data is None:
+            return []
+        return result.data.as_domain_list()
+
+
+    async def _discover(self):
+        """Looks up all endpoints of the domain and prefetches every record
+           the service checks will need, including the addresses of all
+           hosts to connect to, in two deduplicated batches"""
+        domain = self._domain
+        services = self._args.services
+        queries = [(domain, RR_TYPE_A), (domain, RR_TYPE_AAAA)]
+        if 'https' in services:
+            queries.append(("_443._tcp.%s" % domain, RR_TYPE_TLSA))
+        if 'ssh' in services:
+            queries.append((domain, RR_TYPE_SSHFP))
+        if 'dnssec' in services:
+            queries += [(domain, rrtype) for rrtype in
+                        [RR_TYPE_SOA, RR_TYPE_NS, RR_TYPE_DNSKEY, RR_TYPE_DS]]
+
+        mxs, clients, servers, _ = await asyncio.gather(
+            mx_lookup_async(domain, self._resolver) if 'smtp' in services else _nothing(),
+            srv_lookup_async("_xmpp-client._tcp.%s" % domain, self._resolver)
+            if 'xmpp' in services else _nothing(),
+            srv_lookup_async("_xmpp-server._tcp.%s" % domain, self._resolver)
+            if 'xmpp' in services else _nothing(),
+            self._prefetch(queries))
+
+        targets = []
+        if 'https' in services:
+            for rrtype in [RR_TYPE_A, RR_TYPE_AAAA]:
+                if await self._has_data(domain, rrtype):
+                    targets.append(Target('https', domain, 443,
+                                          service_options('https', self._args), 'https'))
+                    break
+
+        for mx in sorted(set(mx for _, mx in mxs)):
+            if mx.rstrip('.') != '':
+                targets.append(Target('smtp', mx, 25, service_options('smtp', self._args), 'smtp'))
+
+        endpoints = []
+        for servicetype, srvrecords in [('client', clients), ('server', servers)]:
+            for endpoint, meta in srvrecords:
+                meta['type'] = servicetype
+                endpoints.append((endpoint, meta))
+        if endpoints:
+            targets.append(Target('xmpp', domain, None, service_options('xmpp', self._args), 'xmpp'))
+
+        if 'ssh' in services and await self._has_data(domain, RR_TYPE_SSHFP):
+            targets.append(Target('ssh', domain, 22, service_options('ssh', self._args), 'ssh'))
+
+        if 'dnssec' in services:
+            targets.append(Target('dnssec', domain, None,
+                                  service_options('dnssec', self._args), 'dnssec'))
+
+        hosts = set(target.host for target in targets if target.protocol == 'smtp')
+        hosts.update(host for (host, _), _ in endpoints)
+        if 'dnssec' in services:
+            hosts.update(await self._nameservers())
+
+        queries = [("_25._tcp.%s" % target.host, RR_TYPE_TLSA)
+                   for target in targets if target.protocol == 'smtp']
+        queries += [("_%d._tcp.%s" % (port, host), RR_TYPE_TLSA) for (host, port), _ in endpoints]
+        queries += [(host, rrtype) for host in sorted(hosts) for rrtype in [RR_TYPE_A, RR_TYPE_AAAA]]
+        await self._prefetch(queries)
+
+        return targets, endpoints
+
+
+    async def _check(self, target, endpoints):
+        args = parse_target(target)
+        loop = asyncio.get_running_loop()
+
+        if target.protocol == 'dnssec':
+            return await loop.run_in_executor(None, dnssec.check, self._sresolver, args)
+
+        elif target.protocol == 'ssh':
+            return await loop.run_in_executor(None, ssh.check, args, self._resolver.context)
+
+        elif target.protocol == 'xmpp':
+            checker = XmppDaneChecker(self._resolver, self._sslcontext, endpoints)
+        else:
+            checker = CHECKERS[target.protocol](self._resolver, self._sslcontext)
+
+        checker.set_args(args)
+        return await checker.check_async()
+
+
+    async def _run_service(self, target, endpoints):
+        try:
+            status = await self._check(target, endpoints)
+        except (Exception, ResolverException, SystemExit) as e:
+            logging.error("%s check of %s failed: %r", target.service, target.host, e)
+            status = 3
+
+        if status is None:
+            status = 3
+        return status
+
+
+    async def check_async(self):
+        try:
+            targets, endpoints = await self._discover()
+        except ResolverException as e:
+            logging.error("Looking up the services of %s failed: %s", self._domain, e.message)
+            return 3
+
+        if targets == []:
+            logging.error("No services found for %s", self._domain)
+            return 3
+
+        statuses = await asyncio.gather(*[self._run_service(target, endpoints)
+                                          for target in targets])
+
+        for target, status in zip(targets, statuses):
+            if target.port is not None:
+                name = "%s:%d" % (target.host, target.port)
+            else:
+                name = target.host
+
+            if status == 0:
+                logging.info("%-6s %s: %s", target.service, name, STATES[status])
+            elif status == 1:
+                logging.warning("%-6s %s: %s", target.service, name, STATES[status])
+            else:
+                logging.error("%-6s %s: %s", target.service, name, STATES[status])
+
+        return max(statuses)
+
+
+    def check(self):
+        return asyncio.run(self.check_async())
+
+
+def main():
+    logging.basicConfig(format='%(levelname)5s %(message)s')
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+
+    parser.add_argument("Domain")
+    parser.add_argument("--services", nargs="+", choices=SERVICES, default=SERVICES,
+                        help="Services to look for and check (default: all)")
+    parser.add_argument("-a", "--ancor",
+                        action="store", type=str, default="/usr/share/dns/root.key",
+                        help="DNSSEC root ancor")
+    parser.add_argument("--castore", action="store", type=str,
+                        default="/etc/ssl/certs/ca-certificates.crt",
+                        help="ca certificate bundle")
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("-6", "--6", action="store_true", dest="use6", help="check via IPv6 only")
+    group.add_argument("-4", "--4", action="store_true", dest="use4", help="check via IPv4 only")
+
+    add_certificate_options(parser)
+
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    else:
+        logging.getLogger().setLevel(logging.INFO)
+
+    return DomainChecker(args).check()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
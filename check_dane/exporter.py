@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from check_dane import dnssec, ssh
+from check_dane.cert import create_sslcontext
+from check_dane.fleet import CHECKERS, load_inventory, parse_target
+from check_dane.resolve import Resolver, ResolverException, AsyncResolver, create_context
+
+
+METRICS = [
+    ('dane_check_status',
+     'Status of the last check (0 OK, 1 WARNING, 2 CRITICAL, 3 UNKNOWN)'),
+    ('dane_check_timestamp_seconds',
+     'Time the last check was started'),
+    ('dane_check_duration_seconds',
+     'Duration of the phases of the last check'),
+    ('dane_tlsa_match',
+     'Whether all presented certificates matched a TLSA record'),
+    ('dane_tlsa_unused_records',
+     'Number of TLSA records not matching any presented certificate'),
+    ('dane_certificate_expiry_timestamp_seconds',
+     'Earliest expiry of the presented certificates'),
+    ('dane_rrsig_expiry_timestamp_seconds',
+     'Earliest expiry of the signatures on the checked records'),
+    ('dane_soa_serial_drift',
+     'Difference between the highest and lowest SOA serial of the authoritative nameservers'),
+]
+
+
+def _labels(labels):
+    return ",".join('%s="%s"' % (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                    for key, value in labels)
+
+
+class MetricsCache:
+    """Keeps the latest samples of every target. The exposition text is
+       rendered by the refresher, scrapes only hand out the cached bytes"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = dict()
+        self._dirty = False
+        self._body = b""
+
+
+    def update(self, target, samples):
+        with self._lock:
+            self._samples[target] = samples
+            self._dirty = True
+
+
+    def render(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            samples = list(self._samples.items())
+            self._dirty = False
+
+        lines = []
+        for name, helptext in METRICS:
+            lines.append("# HELP %s %s" % (name, helptext))
+            lines.append("# TYPE %s gauge" % name)
+            for target, targetsamples in samples:
+                for sample, extralabels, value in targetsamples:
+                    if sample == name:
+                        lines.append("%s{%s} %s" % (name, _labels(target + extralabels), repr(float(value))))
+
+        self._body = ("\n".join(lines) + "\n").encode()
+
+
+    @property
+    def body(self):
+        return self._body
+
+
+class Refresher:
+    """Runs the checks of all targets in the background, each target every
+       interval seconds with at most jobs checks in flight.
+
+       The blocking SSH and DNSSEC checks run on a dedicated pool of jobs
+       threads. A timed out check keeps its thread until it gives up on
+       its own, it can't starve the event loop's default executor."""
+    def __init__(self, targets, cache, interval, jobs, timeout):
+        self._targets = targets
+        self._cache = cache
+        self._interval = interval
+        self._jobs = jobs
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="check")
+        self._resolvers = dict()
+        self._dnssec_resolvers = dict()
+        self._sslcontexts = dict()
+
+
+    def _resolver(self, ancor):
+        if ancor not in self._resolvers:
+            self._resolvers[ancor] = AsyncResolver(create_context(ancor))
+        return self._resolvers[ancor]
+
+
+    def _sslcontext(self, castore):
+        if castore not in self._sslcontexts:
+            self._sslcontexts[castore] = create_sslcontext(castore)
+        return self._sslcontexts[castore]
+
+
+    def _check_dnssec(self, args):
+        if args.ancor not in self._dnssec_resolvers:
+            self._dnssec_resolvers[args.ancor] = Resolver(args.ancor,
+                                                          context=self._resolver(args.ancor).context)
+        resolver = self._dnssec_resolvers[args.ancor]
+
+        state = dnssec.check_zone(resolver, args)
+        samples = [('dane_check_status', (), state.status)]
+
+        if state.serials:
+            serials = [int(serial) for serial in state.serials]
+            samples.append(('dane_soa_serial_drift', (), max(serials) - min(serials)))
+
+        if state.rrsig_expire is not None:
+            samples.append(('dane_rrsig_expiry_timestamp_seconds', (), state.rrsig_expire))
+
+        return samples
+
+
+    async def _check(self, target):
+        args = parse_target(target)
+        loop = asyncio.get_running_loop()
+
+        if target.protocol == 'dnssec':
+            return await loop.run_in_executor(self._executor, self._check_dnssec, args)
+
+        elif target.protocol == 'ssh':
+            status = await loop.run_in_executor(self._executor, ssh.check, args,
+                                                self._resolver(args.ancor).context)
+            return [('dane_check_status', (), 3 if status is None else status)]
+
+        checker = CHECKERS[target.protocol](self._resolver(args.ancor),
+                                            self._sslcontext(args.castore))
+        checker.set_args(args)
+        status = await checker.check_async()
+
+        # match_tlsa_records only reports errors for unmatched certificates,
+        # without any certificate nothing matched either
+        matched = len(checker.certificates) > 0 and checker.tlsa_status != 2
+        samples = [('dane_check_status', (), status),
+                   ('dane_tlsa_match', (), int(matched)),
+                   ('dane_tlsa_unused_records', (), len(checker.unused))]
+        for phase, duration in checker.timings.items():
+            samples.append(('dane_check_duration_seconds', (('phase', phase),), duration))
+        if checker.cert_expire is not None:
+            samples.append(('dane_certificate_expiry_timestamp_seconds', (), checker.cert_expire))
+        if checker.rrsig_expire is not None:
+            samples.append(('dane_rrsig_expiry_timestamp_seconds', (), checker.rrsig_expire))
+
+        return samples
+
+
+    async def refresh(self, target):
+        """Checks target once and stores the samples in the cache"""
+        labels = (('protocol', target.protocol), ('host', target.host),
+                  ('port', target.port or ''), ('service', target.service))
+
+        start = time.time()
+        try:
+            samples = await asyncio.wait_for(self._check(target), self._timeout)
+        except (Exception, ResolverException, SystemExit) as e:
+            logging.error("Checking %s %s failed: %r", target.protocol, target.host, e)
+            samples = [('dane_check_status', (), 3)]
+
+        if not any(sample == 'dane_check_duration_seconds' for sample, _, _ in samples):
+            samples.append(('dane_check_duration_seconds', (('phase', 'total'),),
+                            time.time() - start))
+        samples.append(('dane_check_timestamp_seconds', (), start))
+        self._cache.update(labels, samples)
+
+
+    async def _refresh(self, target, semaphore):
+        while True:
+            async with semaphore:
+                start = time.time()
+                await self.refresh(target)
+
+            await asyncio.sleep(max(0, self._interval - (time.time() - start)))
+
+
+    async def _render(self):
+        while True:
+            self._cache.render()
+            await asyncio.sleep(1)
+
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self._jobs)
+        await asyncio.gather(self._render(),
+                             *[self._refresh(target, semaphore) for target in self._targets])
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.cache.body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        logging.debug(format, *args)
+
+
+def main():
+    logging.basicConfig(format='%(levelname)5s %(message)s')
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+
+    parser.add_argument("Inventory", help="CSV or JSON file listing protocol, host, port and options")
+    parser.add_argument("--address", type=str, default="",
+                        help="Address to listen on for scrapes")
+    parser.add_argument("--port", type=int, default=9552,
+                        help="Port to listen on for scrapes")
+    parser.add_argument("--interval", type=int, default=300,
+                        help="Seconds between checks of a target")
+    parser.add_argument("-j", "--jobs", type=int, default=100,
+                        help="Maximal number of checks in flight")
+    parser.add_argument("--timeout", type=int, default=60,
+                        help="Seconds before a single check is given up")
+
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    else:
+        logging.getLogger().setLevel(logging.INFO)
+
+    cache = MetricsCache()
+    refresher = Refresher(load_inventory(args.Inventory), cache,
+                          args.interval, max(1, args.jobs), args.timeout)
+    threading.Thread(target=asyncio.run, args=(refresher.run(),), daemon=True).start()
+
+    server = ThreadingHTTPServer((args.address, args.port), MetricsHandler)
+    server.cache = cache
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
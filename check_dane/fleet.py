@@ -0,0 +1,362 @@
+#!/usr/bin/python3
+
+from __future__ import print_function
+
+import os
+import csv
+import sys
+import json
+import time
+import shlex
+import signal
+import asyncio
+import logging
+import argparse
+import threading
+from queue import Queue, Empty
+from itertools import count
+from collections import namedtuple, deque, Counter, OrderedDict
+from multiprocessing import Pool, SimpleQueue
+
+from check_dane import dnssec, ssh
+from check_dane.cert import add_certificate_options, create_sslcontext
+from check_dane.https import HttpsDaneChecker
+from check_dane.smtp import SmtpDaneChecker
+from check_dane.xmpp import XmppDaneChecker
+from check_dane.resolve import Resolver, ResolverException, AsyncResolver, create_context
+
+
+CHECKERS = {
+    'https': HttpsDaneChecker,
+    'smtp': SmtpDaneChecker,
+    'xmpp': XmppDaneChecker,
+}
+
+STATES = ['OK', 'WARNING', 'CRITICAL', 'UNKNOWN']
+
+Target = namedtuple('Target', ['protocol', 'host', 'port', 'options', 'service'])
+Result = namedtuple('Result', ['target', 'status', 'output', 'timestamp', 'duration'])
+
+# seconds a worker may overrun the timeout of its check, e.g. while stuck in
+# a blocking call, before it is killed and replaced
+KILL_GRACE = 2
+
+
+def load_inventory(path):
+    """Reads the targets from a CSV or JSON inventory. Each entry needs a
+       protocol and host, port, options and service name are optional
+    """
+    with open(path) as inventory:
+        if path.endswith(".json"):
+            entries = json.load(inventory)
+        else:
+            entries = list(csv.DictReader(inventory))
+
+    targets = []
+    for entry in entries:
+        protocol = entry['protocol'].strip().lower()
+        if protocol not in CHECKERS and protocol not in ('dnssec', 'ssh'):
+            logging.error("Unknown protocol %s for %s, skipping", protocol, entry['host'])
+            continue
+
+        options = entry.get('options') or []
+        if isinstance(options, str):
+            options = shlex.split(options)
+
+        port = entry.get('port') or None
+        if port is not None:
+            port = int(port)
+
+        service = entry.get('service') or "dane_%s" % protocol
+        targets.append(Target(protocol, entry['host'], port, options, service))
+
+    return targets
+
+
+class _Collector(logging.Handler):
+    """Collects the log messages of a single check as plugin output"""
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+# Per worker process state, kept warm across all checks run by the worker
+_resolvers = dict()
+_dnssec_resolvers = dict()
+_sslcontexts = dict()
+_started = None
+
+
+def _init_worker(level, started):
+    global _started
+    _started = started
+
+    logger = logging.getLogger()
+    logger.handlers = []
+    logger.setLevel(level)
+
+
+def _resolver(ancor):
+    if ancor not in _resolvers:
+        _resolvers[ancor] = AsyncResolver(create_context(ancor))
+    return _resolvers[ancor]
+
+
+def _sslcontext(castore):
+    if castore not in _sslcontexts:
+        _sslcontexts[castore] = create_sslcontext(castore)
+    return _sslcontexts[castore]
+
+
+def parse_target(target):
+    """Returns the parsed options for checking an inventory entry"""
+    parser = argparse.ArgumentParser(prog="check_dane_%s" % target.protocol)
+    arguments = [target.host]
+    if target.port is not None and target.protocol != 'dnssec':
+        arguments += ["--port", str(target.port)]
+    arguments += target.options
+
+    if target.protocol == 'dnssec':
+        dnssec.generate_menu(parser)
+    elif target.protocol == 'ssh':
+        ssh.generate_menu(parser)
+    else:
+        CHECKERS[target.protocol]().generate_menu(parser)
+        add_certificate_options(parser)
+
+    return parser.parse_args(arguments)
+
+
+def _run_check(target, timeout):
+    args = parse_target(target)
+
+    if target.protocol == 'dnssec':
+        if args.ancor not in _dnssec_resolvers:
+            _dnssec_resolvers[args.ancor] = Resolver(args.ancor,
+                                                     context=_resolver(args.ancor).context)
+        return dnssec.check(_dnssec_resolvers[args.ancor], args)
+
+    elif target.protocol == 'ssh':
+        return ssh.check(args, _resolver(args.ancor).context)
+
+    else:
+        checker = CHECKERS[target.protocol](_resolver(args.ancor), _sslcontext(args.castore))
+        checker.set_args(args)
+        try:
+            return asyncio.run(asyncio.wait_for(checker.check_async(), timeout))
+        except asyncio.TimeoutError:
+            logging.error("Check timed out after %d seconds", timeout)
+            return 3
+
+
+def run_target(target, timeout=None):
+    """Runs a single check inside a worker process"""
+    collector = _Collector()
+    logger = logging.getLogger()
+    logger.addHandler(collector)
+
+    start = time.time()
+    try:
+        status = _run_check(target, timeout)
+    except ResolverException as e:
+        collector.messages.append("Resolving failed: %s" % e.message)
+        status = 3
+    except (Exception, SystemExit) as e:
+        collector.messages.append("Check failed: %r" % e)
+        status = 3
+    finally:
+        logger.removeHandler(collector)
+
+    if status is None:
+        status = 3
+
+    return Result(target, status, collector.messages, start, time.time() - start)
+
+
+def _run_task(task, target, timeout):
+    """Announces to run_fleet which worker picked up task and runs it"""
+    _started.put((task, os.getpid(), time.time()))
+    return run_target(target, timeout)
+
+
+def _forward(started, done):
+    for task, pid, start in iter(started.get, None):
+        done.put((task, (pid, start)))
+
+
+def _kill(pid):
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_fleet(targets, jobs, perhost, level, emit, timeout=300):
+    """Runs all targets on a pool of jobs processes. At most jobs checks are
+       in flight at any time and at most perhost against a single host.
+       emit is called for every result as soon as it is available.
+
+       Checks time out timeout seconds after a worker picked them up. The
+       worker cancels its check itself, workers still busy KILL_GRACE
+       seconds later are killed and replaced by the pool. Checks without
+       result at that point, e.g. because their worker died, are reported
+       as UNKNOWN.
+    """
+    queues = OrderedDict()
+    for target in targets:
+        queues.setdefault(target.host, deque()).append(target)
+
+    active = Counter()
+    ready = deque(queues)
+    done = Queue()
+    started = SimpleQueue()
+    tasks = count()
+    pending = dict()
+    running = dict()
+    workers = dict()
+    expired = set()
+    limit = timeout + KILL_GRACE
+
+    forwarder = threading.Thread(target=_forward, args=(started, done), daemon=True)
+    forwarder.start()
+
+    with Pool(jobs, initializer=_init_worker, initargs=(level, started)) as pool:
+        while ready or pending:
+            while ready and len(pending) < jobs:
+                host = ready.popleft()
+                target = queues[host].popleft()
+                task = next(tasks)
+                pool.apply_async(_run_task, (task, target, timeout),
+                                 callback=lambda result, task=task: done.put((task, result)),
+                                 error_callback=lambda e, task=task, target=target: done.put(
+                                     (task, Result(target, 3, ["Check failed: %r" % e], time.time(), 0))))
+                pending[task] = (target, time.time())
+                active[host] += 1
+                if queues[host] and active[host] < perhost:
+                    ready.append(host)
+
+            # checks not picked up yet wait at most for a stuck worker to
+            # be killed
+            deadlines = {task: running[task][1] + limit if task in running
+                         else dispatched + 2 * limit
+                         for task, (_, dispatched) in pending.items()}
+            try:
+                events = [done.get(timeout=max(0, min(deadlines.values()) - time.time()))]
+            except Empty:
+                now = time.time()
+                events = []
+                for task, deadline in deadlines.items():
+                    if deadline > now:
+                        continue
+
+                    target, dispatched = pending[task]
+                    pid, start = running.get(task, (None, dispatched))
+                    if pid is None:
+                        expired.add(task)
+                    elif workers.get(pid) == task:
+                        _kill(pid)
+                    events.append((task, Result(target, 3,
+                                                ["Check timed out after %d seconds" % timeout],
+                                                start, now - start)))
+
+            for task, result in events:
+                if not isinstance(result, Result):
+                    pid, start = result
+                    if task in pending:
+                        running[task] = result
+                        workers[pid] = task
+                    elif task in expired:
+                        # the check already timed out waiting for a worker
+                        expired.discard(task)
+                        _kill(pid)
+                    continue
+
+                # results of checks already reported as timed out are dropped
+                if pending.pop(task, None) is None:
+                    continue
+                running.pop(task, None)
+
+                host = result.target.host
+                active[host] -= 1
+                if queues[host] and active[host] == perhost - 1:
+                    ready.append(host)
+
+                emit(result)
+
+    started.put(None)
+    forwarder.join()
+
+
+def format_passive(result):
+    """Formats a result as icinga / nagios external command"""
+    output = "DANE %s: %s" % (STATES[result.status], " / ".join(result.output))
+    return "[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%d;%s" % (
+        result.timestamp, result.target.host, result.target.service, result.status,
+        output.replace("\n", " ").replace(";", ","))
+
+
+def format_json(result):
+    return json.dumps({
+        'protocol': result.target.protocol,
+        'host': result.target.host,
+        'port': result.target.port,
+        'service': result.target.service,
+        'status': result.status,
+        'output': result.output,
+        'timestamp': result.timestamp,
+        'duration': result.duration,
+    })
+
+
+def main():
+    logging.basicConfig(format='%(levelname)5s %(message)s')
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+
+    parser.add_argument("Inventory", help="CSV or JSON file listing protocol, host, port and options")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Maximal number of checks in flight (default: number of cores)")
+    parser.add_argument("--per-host", type=int, default=2,
+                        help="Maximal number of concurrent checks against one host")
+    parser.add_argument("--format", choices=["passive", "json"], default="passive",
+                        help="Output icinga passive check results or JSON lines")
+    parser.add_argument("--command-file", type=str, default=None,
+                        help="Write results to the icinga command pipe instead of stdout")
+    parser.add_argument("--timeout", type=int, default=300,
+                        help="Seconds a check may run before it is reported as UNKNOWN")
+
+    args = parser.parse_args()
+
+    if args.verbose:
+        level = logging.DEBUG
+    elif args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+
+    targets = load_inventory(args.Inventory)
+    formatter = format_passive if args.format == "passive" else format_json
+    output = open(args.command_file, "a") if args.command_file else sys.stdout
+
+    def emit(result):
+        print(formatter(result), file=output)
+        output.flush()
+
+    try:
+        run_fleet(targets, max(1, args.jobs), max(1, args.per_host), level, emit,
+                  args.timeout)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
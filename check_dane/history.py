@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import zlib
+from hashlib import sha256
+import struct
+import tempfile
+import logging
+import argparse
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MAGIC = b"DANEHIST1"
+
+# timestamp, target id, certificate days left, rrsig days left, status,
+# padding, digest of the certificate fingerprints -- 32 bytes per observation
+RECORD = struct.Struct("<dIhhB7x8s")
+HEADER = RECORD.size
+MISSING = -32768
+
+DTYPE = [('timestamp', '<f8'), ('target', '<u4'), ('certdays', '<i2'),
+         ('rrsigdays', '<i2'), ('status', 'u1'), ('padding', 'V7'),
+         ('fingerprint', 'S8')]
+
+
+def target_id(target):
+    return zlib.crc32(target.encode())
+
+
+def certificates_digest(fingerprints):
+    """Returns a short digest identifying a set of certificates independent
+       of the order they were seen in"""
+    if not fingerprints:
+        return b""
+    return sha256(b"".join(sorted(fingerprints))).digest()[:8]
+
+
+def index_path(path):
+    return path + ".targets"
+
+
+def load_targets(path):
+    """Returns a dict mapping the target ids of a history file to names"""
+    targets = dict()
+    try:
+        with open(index_path(path)) as indexfile:
+            for line in indexfile:
+                tid, _, name = line.rstrip("\n").partition(" ")
+                targets[int(tid, 16)] = name
+    except FileNotFoundError:
+        pass
+    return targets
+
+
+def _days(expire, now):
+    if expire is None:
+        return MISSING
+    return max(MISSING + 1, min(32767, int((expire - now) // 86400)))
+
+
+class History:
+    """Append-only store of fixed size observations. Records are written
+       with a single O_APPEND write so concurrent checks can share a file"""
+    def __init__(self, path):
+        self._path = path
+        self._targets = None
+
+
+    def _create(self):
+        """Creates the file with its header written to a temporary file and
+           linked into place, so no appender ever sees it without header"""
+        fd, tmppath = tempfile.mkstemp(prefix=os.path.basename(self._path) + ".",
+                                       dir=os.path.dirname(os.path.abspath(self._path)))
+        try:
+            with os.fdopen(fd, "wb") as historyfile:
+                historyfile.write(MAGIC.ljust(HEADER, b"\0"))
+            os.chmod(tmppath, 0o644)
+            try:
+                os.link(tmppath, self._path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmppath)
+
+
+    def _open(self):
+        try:
+            return os.open(self._path, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            self._create()
+            return os.open(self._path, os.O_WRONLY | os.O_APPEND)
+
+
+    def _register(self, target):
+        """Adds the name of target to the index on its first observation"""
+        if self._targets is None:
+            self._targets = set(load_targets(self._path))
+
+        tid = target_id(target)
+        if tid in self._targets:
+            return
+
+        fd = os.open(index_path(self._path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, ("%08x %s\n" % (tid, target)).encode())
+        finally:
+            os.close(fd)
+        self._targets.add(tid)
+
+
+    def append(self, target, status, cert_expire, rrsig_expire, fingerprints, now=None):
+        if now is None:
+            now = time.time()
+
+        record = RECORD.pack(now, target_id(target), _days(cert_expire, now),
+                             _days(rrsig_expire, now), status, certificates_digest(fingerprints))
+
+        self._register(target)
+        fd = self._open()
+        try:
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+
+
+def load(path):
+    """Maps the observations of a history file as numpy record array"""
+    with open(path, "rb") as historyfile:
+        if historyfile.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a history file" % path)
+
+    count = (os.path.getsize(path) - HEADER) // RECORD.size
+    if count == 0:
+        return numpy.zeros(0, dtype=DTYPE)
+
+    return numpy.memmap(path, dtype=DTYPE, mode='r', offset=HEADER, shape=(count,))
+
+
+def summarize(records):
+    """Returns per target statistics and the rotation events of all
+       observations, computed without iterating over single records"""
+    records = records[numpy.lexsort((records['timestamp'], records['target']))]
+    targets, starts, counts = numpy.unique(records['target'], return_index=True,
+                                           return_counts=True)
+    last = starts + counts - 1
+
+    certdays = records['certdays'].astype(numpy.int32)
+    rrsigdays = records['rrsigdays'].astype(numpy.int32)
+
+    # observations without certificates, e.g. of failed checks, are skipped
+    # when comparing each one with the previous one of its target
+    seen = numpy.nonzero(records['fingerprint'] != b"")[0]
+    previous = numpy.zeros(len(records), dtype=numpy.intp)
+    previous[seen[1:]] = seen[:-1]
+
+    rotated = numpy.zeros(len(records), dtype=bool)
+    rotated[seen[1:]] = ((records['target'][seen[1:]] == records['target'][seen[:-1]]) &
+                         (records['fingerprint'][seen[1:]] != records['fingerprint'][seen[:-1]]))
+
+    group = numpy.repeat(numpy.arange(len(targets)), counts)
+    rotations = numpy.bincount(group, weights=rotated, minlength=len(targets)).astype(int)
+
+    # days left on the old certificate when it got replaced
+    events = numpy.nonzero(rotated)[0]
+    replaced = previous[events]
+    margins = numpy.full(len(targets), 32767, dtype=numpy.int32)
+    numpy.minimum.at(margins, group[events], numpy.where(certdays[replaced] == MISSING, 32767,
+                                                         certdays[replaced]))
+
+    def minimum(days):
+        return numpy.minimum.reduceat(numpy.where(days == MISSING, 32767, days), starts)
+
+    summary = {
+        'target': targets,
+        'observations': counts,
+        'first': records['timestamp'][starts],
+        'last': records['timestamp'][last],
+        'status': records['status'][last],
+        'certdays': certdays[last],
+        'mincertdays': minimum(certdays),
+        'rrsigdays': rrsigdays[last],
+        'minrrsigdays': minimum(rrsigdays),
+        'rotations': rotations,
+        'rotationmargin': margins,
+    }
+    return summary, records[replaced], records[events]
+
+
+def _format_days(days):
+    if days in (MISSING, 32767):
+        return "-"
+    return str(days)
+
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.gmtime(timestamp))
+
+
+def add_history_options(argparser):
+    argparser.add_argument("--history", action="store", type=str, default=None,
+                           help="Append an observation of every full check to this history file")
+
+
+def main():
+    logging.basicConfig(format='%(levelname)5s %(message)s')
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("History", help="history file written via --history")
+    parser.add_argument("-t", "--target", action="append", default=[],
+                        help="Only show this target, e.g. 'HttpsDaneChecker example.org:443' (may be repeated)")
+    parser.add_argument("--events", action="store_true",
+                        help="List certificate rotation events")
+
+    args = parser.parse_args()
+
+    if numpy is None:
+        logging.error("Querying the history needs numpy")
+        return 3
+
+    records = load(args.History)
+    names = load_targets(args.History)
+    if args.target:
+        selected = [target_id(name) for name in args.target]
+        names.update(zip(selected, args.target))
+        records = records[numpy.isin(records['target'], selected)]
+
+    if len(records) == 0:
+        logging.warning("No observations found")
+        return 0
+
+    summary, before, after = summarize(records)
+
+    print("%-40s %6s %-16s %-8s %9s %9s %10s %10s %9s %8s" % (
+        "target", "obs", "last", "status", "certdays", "min", "rrsigdays", "min",
+        "rotations", "margin"))
+    for i, target in enumerate(summary['target']):
+        print("%-40s %6d %-16s %-8d %9s %9s %10s %10s %9d %8s" % (
+            names.get(target, "%08x" % target), summary['observations'][i],
+            _format_time(summary['last'][i]), summary['status'][i],
+            _format_days(summary['certdays'][i]), _format_days(summary['mincertdays'][i]),
+            _format_days(summary['rrsigdays'][i]), _format_days(summary['minrrsigdays'][i]),
+            summary['rotations'][i], _format_days(summary['rotationmargin'][i])))
+
+    if args.events:
+        print()
+        for old, new in zip(before, after):
+            print("%s %-40s %s -> %s (%s days left)" % (
+                _format_time(new['timestamp']), names.get(new['target'], "%08x" % new['target']),
+                old['fingerprint'].hex(), new['fingerprint'].hex(),
+                _format_days(old['certdays'])))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,26 +2,24 @@
 
 from __future__ import print_function
 
+import asyncio
 import argparse
 import logging
 
-from ssl import SSLContext, PROTOCOL_TLSv1_2, CERT_REQUIRED
-from socket import socket
-
-from check_dane.cert import add_certificate_options
-from check_dane.abstract import DaneChecker
+from check_dane.cert import add_certificate_options, create_sslcontext
+from check_dane.abstract import DaneChecker, close_stream
 
 
 class HttpsDaneChecker(DaneChecker):
-    def _init_connection(self, family, host, port):
-        connection = self._sslcontext.wrap_socket(socket(family),
-                                                  server_hostname=host)
-        connection.connect((host, port))
-        connection.send(b"HEAD / HTTP/1.1\r\nHost: %s\r\n\r\n" % host.encode())
-        answer = connection.recv(512)
+    async def _init_connection(self, address, host, port):
+        reader, writer = await asyncio.open_connection(address, port,
+                                                       ssl=self._sslcontext,
+                                                       server_hostname=host)
+        writer.write(b"HEAD / HTTP/1.1\r\nHost: %s\r\n\r\n" % host.encode())
+        answer = await reader.read(512)
         logging.debug(answer)
 
-        return connection
+        return reader, writer
 
 
     @property
@@ -29,12 +27,12 @@ class HttpsDaneChecker(DaneChecker):
         return self._port
 
 
-    def _close_connection(self, connection):
-        connection.close()
+    async def _close_connection(self, reader, writer):
+        await close_stream(writer)
 
 
-    def __init__(self):
-        DaneChecker.__init__(self)
+    def __init__(self, resolver=None, sslcontext=None):
+        DaneChecker.__init__(self, resolver, sslcontext)
 
 
     def set_args(self, args):
@@ -42,11 +40,8 @@ class HttpsDaneChecker(DaneChecker):
 
         self._port = args.port
 
-        sslcontext = SSLContext(PROTOCOL_TLSv1_2)
-        sslcontext.verify_mode = CERT_REQUIRED
-        sslcontext.load_verify_locations(args.castore)
-
-        self._sslcontext = sslcontext
+        if self._sslcontext is None:
+            self._sslcontext = create_sslcontext(args.castore)
 
 
     def generate_menu(self, argparser):
@@ -1,14 +1,22 @@
 #!/usr/bin/python3
 
 import struct
+import asyncio
 import logging
+from socket import AF_INET6
+from calendar import timegm
 from datetime import datetime
 
-from unbound import ub_ctx, ub_strerror
-from unbound import RR_TYPE_A, RR_TYPE_AAAA, RR_TYPE_RRSIG, RR_TYPE_SRV
+from unbound import ub_ctx, ub_strerror, RR_CLASS_IN
+from unbound import RR_TYPE_A, RR_TYPE_AAAA, RR_TYPE_RRSIG, RR_TYPE_SRV, RR_TYPE_MX
 
-from ldns import ldns_wire2pkt
-from ldns import LDNS_SECTION_ANSWER
+# only check_dnssec requires ldns, without it the other plugins don't
+# learn when the signatures of the TLSA records expire
+try:
+    from ldns import ldns_wire2pkt
+    from ldns import LDNS_SECTION_ANSWER
+except ImportError:
+    ldns_wire2pkt = None
 
 
 def _parse_rrsig_date(expirestring):
@@ -63,10 +71,38 @@ def dnssec_verify_rrsig_validity(data, warn=-1, critical=0):
         logging.warning("expires in %8s,%16s", deltastr[0], deltastr[1])
         return 1
 
+    return 0
 
-def srv_lookup(name, resolver):
+
+def rrsig_expiration(data):
+    """Given a answer packet return the earliest expiry of all contained
+       rrsigs as unix timestamp or None if the answer is unsigned or ldns
+       is not available
+    """
+    if ldns_wire2pkt is None:
+        return None
+
+    s, packet = ldns_wire2pkt(data)
+    if s != 0:
+        logging.error("Parsing packet failed with errorcode %d", s)
+        return None
+
+    rrsigs = packet.rr_list_by_type(RR_TYPE_RRSIG, LDNS_SECTION_ANSWER)
+    if rrsigs is None:
+        return None
+
+    expires = [_parse_rrsig_date(str(rrsig.rrsig_expiration())) for rrsig in rrsigs.rrs()]
+    if expires == []:
+        return None
+
+    return timegm(min(expires).utctimetuple())
+
+
+def _srv_records(result):
     retval = []
-    result = resolver.resolve(name, rrtype=RR_TYPE_SRV)
+    if result.data is None:
+        return retval
+
     for bytevalue in result.data.raw:
         priority, weight, port = struct.unpack("!HHH", bytevalue[:6])
         hostname = '.'.join(result.data.dname2str(bytevalue[6:]))
@@ -74,6 +110,65 @@ def srv_lookup(name, resolver):
     return retval
 
 
+def srv_lookup(name, resolver):
+    result = resolver.resolve(name, rrtype=RR_TYPE_SRV)
+    return _srv_records(result)
+
+
+async def srv_lookup_async(name, resolver):
+    """Same as srv_lookup using an AsyncResolver"""
+    status, result = await resolver.resolve(name, RR_TYPE_SRV)
+    if 0 != status:
+        raise ResolverException(ub_strerror(status))
+
+    return _srv_records(result)
+
+
+async def mx_lookup_async(name, resolver):
+    """Returns the (preference, hostname) tuples of all MX records of name"""
+    status, result = await resolver.resolve(name, RR_TYPE_MX)
+    if 0 != status:
+        raise ResolverException(ub_strerror(status))
+
+    retval = []
+    if result.data is None:
+        return retval
+
+    for bytevalue in result.data.raw:
+        preference, = struct.unpack("!H", bytevalue[:2])
+        hostname = '.'.join(result.data.dname2str(bytevalue[2:]))
+        retval.append((preference, hostname))
+    return sorted(retval)
+
+
+def create_context(ancor):
+    """Returns a validating unbound context. Asynchronous queries run in a
+       thread instead of a forked process so they share the cache with
+       synchronous lookups on the same context
+    """
+    context = ub_ctx()
+    context.set_async(True)
+    status = context.add_ta_file(ancor)
+    if status != 0:
+        raise ResolverException(ub_strerror(status))
+
+    return context
+
+
+async def address_lookup_async(name, family, resolver):
+    """Returns the addresses of name for the address family using an
+       AsyncResolver"""
+    rrtype = RR_TYPE_AAAA if family == AF_INET6 else RR_TYPE_A
+    status, result = await resolver.resolve(name, rrtype)
+    if 0 != status:
+        raise ResolverException(ub_strerror(status))
+
+    if result.data is None:
+        return []
+
+    return [format_address(data, rrtype) for data in result.data.data]
+
+
 class ResolverException(BaseException):
     def __init__(self, message):
         BaseException.__init__(self)
@@ -81,7 +176,11 @@ class ResolverException(BaseException):
 
 
 class Resolver:
-    def __init__(self, ancor, fwd=None):
+    def __init__(self, ancor, fwd=None, context=None):
+        if context is not None:
+            self._resolver = context
+            return
+
         self._resolver = ub_ctx()
         status = self._resolver.add_ta_file(ancor)
         if status != 0:
@@ -102,3 +201,60 @@ class Resolver:
             raise ResolverException("Response was not signed")
 
         return result
+
+
+
+class AsyncResolver:
+    """Drives the asynchronous interface of an unbound context from the
+       running asyncio event loop by watching the context's file descriptor
+    """
+    def __init__(self, context):
+        self._context = context
+        self._pending = 0
+
+
+    @property
+    def context(self):
+        return self._context
+
+
+    async def resolve(self, name, rrtype):
+        """Same as ub_ctx.resolve, returning a (status, result) tuple"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def callback(_, status, result):
+            if not future.done():
+                future.set_result((status, result))
+
+        status, _ = self._context.resolve_async(name, None, callback, rrtype, RR_CLASS_IN)
+        if status != 0:
+            return status, None
+
+        if self._pending == 0:
+            loop.add_reader(self._context.fd(), self._context.process)
+        self._pending += 1
+
+        try:
+            return await future
+        finally:
+            self._pending -= 1
+            if self._pending == 0:
+                loop.remove_reader(self._context.fd())
+
+
+
+class CachingAsyncResolver(AsyncResolver):
+    """AsyncResolver answering repeated queries for the same name and type
+       from the first lookup, so a batch of lookups is deduplicated"""
+    def __init__(self, context):
+        AsyncResolver.__init__(self, context)
+        self._queries = dict()
+
+
+    async def resolve(self, name, rrtype):
+        key = (name.lower().rstrip('.'), rrtype)
+        if key not in self._queries:
+            self._queries[key] = asyncio.ensure_future(AsyncResolver.resolve(self, name, rrtype))
+
+        return await asyncio.shield(self._queries[key])
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+
+import json
+import time
+import sqlite3
+import logging
+from hashlib import sha256
+from collections import namedtuple
+
+
+CheckState = namedtuple('CheckState', ['status', 'checked', 'tlsa_hash', 'tlsa_ttl',
+                                       'fingerprints', 'cert_expire', 'rrsig_expire',
+                                       'tlsa_checked'])
+
+
+def hash_records(records):
+    """Returns a digest over a set of TLSA records independent of their order"""
+    digest = sha256()
+    for record in sorted(records, key=lambda r: (r.usage, r.selector, r.matching, r.payload)):
+        digest.update(bytes([record.usage, record.selector, record.matching]))
+        digest.update(record.payload)
+
+    return digest.hexdigest()
+
+
+class Scheduler:
+    """Keeps per target state of the last full check in a SQLite database
+       and decides when the next full check is needed. A check only reads
+       and writes the row of its own target, so its cost doesn't grow with
+       the number of targets sharing the database"""
+    def __init__(self, path, mininterval, maxinterval, warndays=-1, critdays=-1):
+        self._mininterval = mininterval
+        self._maxinterval = maxinterval
+        self._warndays = max(0, warndays)
+        self._critdays = max(0, critdays)
+        self._states = dict()
+
+        # concurrent checks wait for each other's writes instead of failing
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS states "
+                             "(target TEXT PRIMARY KEY, state TEXT NOT NULL)")
+
+
+    def lookup(self, target):
+        if target not in self._states:
+            row = self._db.execute("SELECT state FROM states WHERE target = ?",
+                                   (target,)).fetchone()
+            state = None
+            if row is not None:
+                try:
+                    state = CheckState(**json.loads(row[0]))
+                except (ValueError, TypeError):
+                    logging.warning("Ignoring unreadable state of %s", target)
+            self._states[target] = state
+
+        return self._states[target]
+
+
+    def next_check(self, state):
+        """Returns the unix timestamp the target needs a full check again.
+
+           Targets in a non-OK state are rechecked after the minimal
+           interval. Otherwise the next full check is due once the
+           certificate or signature expiry crosses a warning or error
+           threshold, but at least after the maximal interval.
+        """
+        if state.status != 0:
+            return state.checked + self._mininterval
+
+        candidates = [state.checked + self._maxinterval]
+        for expire in (state.cert_expire, state.rrsig_expire):
+            if expire is None:
+                continue
+
+            for days in (self._warndays, self._critdays, 0):
+                threshold = expire - days * 86400
+                if threshold > state.checked:
+                    candidates.append(threshold)
+
+        return max(state.checked + self._mininterval, min(candidates))
+
+
+    def next_tlsa_check(self, state):
+        """Returns the unix timestamp the TLSA RRset of the target may have
+           changed and needs to be queried again or None if its TTL is
+           unknown"""
+        if state.tlsa_ttl is None:
+            return None
+
+        return state.tlsa_checked + state.tlsa_ttl
+
+
+    def due(self, target, now=None):
+        state = self.lookup(target)
+        if state is None:
+            return True
+
+        if now is None:
+            now = time.time()
+
+        return now >= self.next_check(state)
+
+
+    def tlsa_due(self, target, now=None):
+        state = self.lookup(target)
+        if state is None:
+            return True
+
+        if now is None:
+            now = time.time()
+
+        deadline = self.next_tlsa_check(state)
+        return deadline is not None and now >= deadline
+
+
+    def update(self, target, state):
+        """Stores the new state of target"""
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO states (target, state) VALUES (?, ?)",
+                             (target, json.dumps(state._asdict())))
+        self._states[target] = state
+
+
+def add_schedule_options(argparser):
+    argparser.add_argument("--state", action="store", type=str, default=None,
+                           help="State database (SQLite) enabling adaptive scheduling of full checks")
+    argparser.add_argument("--min-interval", type=int, default=300,
+                           help="Seconds between full checks of targets in a non-OK state")
+    argparser.add_argument("--max-interval", type=int, default=86400,
+                           help="Maximal seconds between full checks of any target")
@@ -4,52 +4,48 @@
 
 from __future__ import print_function
 
+import asyncio
 import argparse
 import logging
 
-from ssl import SSLContext, PROTOCOL_TLSv1_2, CERT_REQUIRED
-from socket import socket
-
-from check_dane.cert import add_certificate_options
-from check_dane.abstract import DaneChecker
+from check_dane.cert import add_certificate_options, create_sslcontext
+from check_dane.abstract import DaneChecker, close_stream
 
 
 class SmtpDaneChecker(DaneChecker):
-    def _init_connection(self, family, host, port):
+    async def _init_connection(self, address, host, port):
 
         if self.ssl:
-            connection = self._sslcontext.wrap_socket(socket(family),
-                                                      server_hostname=host)
-            connection.connect((host, port))
-            answer = connection.recv(512)
+            reader, writer = await asyncio.open_connection(address, port,
+                                                           ssl=self._sslcontext,
+                                                           server_hostname=host)
+            answer = await reader.read(512)
             logging.debug(answer)
 
-            connection.send(b"EHLO localhost\r\n")
-            answer = connection.recv(512)
+            writer.write(b"EHLO localhost\r\n")
+            answer = await reader.read(512)
             logging.debug(answer)
 
         else:
-            connection = socket(family=family)
-            connection.connect((host, port))
-            answer = connection.recv(512)
+            reader, writer = await asyncio.open_connection(address, port)
+            answer = await reader.read(512)
             logging.debug(answer)
 
-            connection.send(b"EHLO localhost\r\n")
-            answer = connection.recv(512)
+            writer.write(b"EHLO localhost\r\n")
+            answer = await reader.read(512)
             logging.debug(answer)
 
-            connection.send(b"STARTTLS\r\n")
-            answer = connection.recv(512)
+            writer.write(b"STARTTLS\r\n")
+            answer = await reader.read(512)
             logging.debug(answer)
 
-            connection = self._sslcontext.wrap_socket(connection, server_hostname=host)
-            connection.do_handshake()
+            await writer.start_tls(self._sslcontext, server_hostname=host)
 
-            connection.send(b"EHLO localhost\r\n")
-            answer = connection.recv(512)
+            writer.write(b"EHLO localhost\r\n")
+            answer = await reader.read(512)
             logging.debug(answer)
 
-        return connection
+        return reader, writer
 
 
     @property
@@ -62,17 +58,23 @@ class SmtpDaneChecker(DaneChecker):
         return self._ssl
 
 
-    def _close_connection(self, connection):
-        connection.send(b"QUIT\r\n")
-        answer = connection.recv(512)
+    @property
+    def target(self):
+        return "%s %s:%d%s%s" % (type(self).__name__, self._host, self.port,
+                                 " ssl" if self.ssl else "", self._family)
+
+
+    async def _close_connection(self, reader, writer):
+        writer.write(b"QUIT\r\n")
+        answer = await reader.read(512)
         logging.debug(answer)
-        connection.close()
+        await close_stream(writer)
 
 
-    def __init__(self):
+    def __init__(self, resolver=None, sslcontext=None):
         self._port = None
         self._ssl = None
-        DaneChecker.__init__(self)
+        DaneChecker.__init__(self, resolver, sslcontext)
 
 
     def set_args(self, args):
@@ -84,11 +86,8 @@ class SmtpDaneChecker(DaneChecker):
         else:
             self._port = args.port
 
-        sslcontext = SSLContext(PROTOCOL_TLSv1_2)
-        sslcontext.verify_mode = CERT_REQUIRED
-        sslcontext.load_verify_locations(args.castore)
-
-        self._sslcontext = sslcontext
+        if self._sslcontext is None:
+            self._sslcontext = create_sslcontext(args.castore)
 
 
     def generate_menu(self, argparser):
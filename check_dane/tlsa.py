@@ -4,8 +4,10 @@ import sys
 import codecs
 import hashlib
 import logging
+from collections import namedtuple
 
 from .cert import get_spki
+from .resolve import rrsig_expiration
 
 from unbound import ub_strerror
 
@@ -15,6 +17,8 @@ except ImportError:
     RR_TYPE_TLSA = 52
 
 
+TLSARRset = namedtuple('TLSARRset', ['records', 'ttl', 'expires'])
+
 
 class TLSARecord:
     """Class representing a TLSA record"""
@@ -85,18 +89,14 @@ class TLSARecord:
 
 
 
-def get_tlsa_records(resolver, name):
-    """Extracts all TLSA records for a given name"""
-
-    logging.debug("searching for TLSA record on %s", name)
-    s, r = resolver.resolve(name, rrtype=RR_TYPE_TLSA)
+def _tlsa_rrset(s, r):
     if 0 != s:
-        ub_strerror(s)
+        logging.error("TLSA lookup failed: %s", ub_strerror(s))
         return
 
     if r.data is None:
         logging.warning("No TLSA record returned")
-        return set()
+        return TLSARRset(set(), r.ttl, None)
 
     result = set()
     for record in r.data.data:
@@ -105,14 +105,43 @@ def get_tlsa_records(resolver, name):
         matching = record[2]
         data = record[3:]
         result.add(TLSARecord(usage, selector, matching, data))
-        
-    return result
+
+    return TLSARRset(result, r.ttl, rrsig_expiration(r.packet))
+
+
+def get_tlsa_rrset(resolver, name):
+    """Extracts all TLSA records for a given name together with the TTL
+       and the earliest signature expiry of the RRset"""
+
+    logging.debug("searching for TLSA record on %s", name)
+    s, r = resolver.resolve(name, rrtype=RR_TYPE_TLSA)
+    return _tlsa_rrset(s, r)
+
+
+async def get_tlsa_rrset_async(resolver, name):
+    """Same as get_tlsa_rrset using an AsyncResolver"""
+
+    logging.debug("searching for TLSA record on %s", name)
+    s, r = await resolver.resolve(name, RR_TYPE_TLSA)
+    return _tlsa_rrset(s, r)
+
+
+def get_tlsa_records(resolver, name):
+    """Extracts all TLSA records for a given name"""
+
+    rrset = get_tlsa_rrset(resolver, name)
+    if rrset is None:
+        return
+
+    return rrset.records
 
 
-def match_tlsa_records(records, certificates):
-    """Returns all TLSA records matching the certificate"""
+def match_tlsa_records(records, certificates, usedrecords=None):
+    """Returns all TLSA records matching the certificate. If usedrecords is
+       given, all records matching any certificate are added to it"""
 
-    usedrecords = set()
+    if usedrecords is None:
+        usedrecords = set()
     result = 0
 
     for certificate in certificates:
@@ -4,16 +4,13 @@
 
 from __future__ import print_function
 
+import asyncio
 import argparse
 import logging
 
-from ssl import SSLContext, PROTOCOL_TLSv1_2, CERT_REQUIRED
-from socket import socket
-
-from check_dane.tlsa import get_tlsa_records
-from check_dane.cert import add_certificate_options
-from check_dane.abstract import DaneChecker
-from check_dane.resolve import Resolver, srv_lookup
+from check_dane.cert import add_certificate_options, create_sslcontext
+from check_dane.abstract import DaneChecker, close_stream
+from check_dane.resolve import srv_lookup_async
 
 XMPP_OPEN = ("<stream:stream xmlns='jabber:{0}' xmlns:stream='"
              "http://etherx.jabber.org/streams' xmlns:tls='http://www.ietf.org/rfc/"
@@ -22,38 +19,36 @@ XMPP_CLOSE = "</stream:stream>"
 XMPP_STARTTLS = "<starttls xmlns='urn:ietf:params:xml:ns:xmpp-tls'/>"
 
 class XmppDaneChecker(DaneChecker):
-    def _init_connection(self, family, host, port):
+    async def _init_connection(self, address, host, port):
 
-        logging.debug("Connecting to %s:%d", host, port)
+        logging.debug("Connecting to %s:%d (%s)", host, port, address)
+        servicetype = self.servicetype(host, port)
 
-        connection = socket(family=family)
-        connection.connect((host, port))
+        reader, writer = await asyncio.open_connection(address, port)
 
-        connection.sendall(XMPP_OPEN.format(self.servicetype, self._hostname).encode())
-        answer = connection.recv(4096)
+        writer.write(XMPP_OPEN.format(servicetype, self._hostname).encode())
+        answer = await reader.read(4096)
         logging.debug(answer)
 
         if not b'</stream:features>' in answer:
-            answer = connection.recv(4096)
+            answer = await reader.read(4096)
             logging.debug(answer)
 
-        connection.sendall(XMPP_STARTTLS.encode())
-        answer = connection.recv(4096)
+        writer.write(XMPP_STARTTLS.encode())
+        answer = await reader.read(4096)
         logging.debug(answer)
 
-        print(host, self._hostname)
-        connection = self._sslcontext.wrap_socket(connection, server_hostname=self._hostname)
-        connection.do_handshake()
+        await writer.start_tls(self._sslcontext, server_hostname=self._hostname)
 
-        connection.sendall(XMPP_OPEN.format(self.servicetype, self._hostname).encode())
-        answer = connection.recv(4096)
+        writer.write(XMPP_OPEN.format(servicetype, self._hostname).encode())
+        answer = await reader.read(4096)
         logging.debug(answer)
 
         if not b'</stream:features>' in answer:
-            answer = connection.recv(4096)
+            answer = await reader.read(4096)
             logging.debug(answer)
 
-        return connection
+        return reader, writer
 
 
     @property
@@ -62,71 +57,75 @@ class XmppDaneChecker(DaneChecker):
 
 
     @property
-    def servicetype(self):
-        return self._type
-
+    def target(self):
+        if self._args.s2s:
+            services = "s2s"
+        elif self._args.c2s:
+            services = "c2s"
+        else:
+            services = "c2s s2s"
+        return "%s %s %s%s" % (type(self).__name__, self._host, services, self._family)
 
-    def _gather_certificates(self):
-        result = set()
-        for (host, port), meta in self._endpoints:
-            self._host = host
-            self._port = port
-            self._type = meta['type']
-            result.update(DaneChecker._gather_certificates(self))
 
-        return result
+    def servicetype(self, host, port):
+        for endpoint, meta in self._endpoints:
+            if endpoint == (host, port):
+                return meta['type']
 
 
-    def _gather_records(self):
-        result = set()
-        for (host, port), _ in self._endpoints:
-            print(repr((host, port)))
-            result.update(get_tlsa_records(self._resolver, "_%d._tcp.%s" % (port, host)))
+    def _services(self):
+        return [endpoint for endpoint, _ in self._endpoints]
 
-        return result
 
-
-    def _close_connection(self, connection):
-        connection.send(XMPP_CLOSE.encode())
-        answer = connection.recv(512)
+    async def _close_connection(self, reader, writer):
+        writer.write(XMPP_CLOSE.encode())
+        answer = await reader.read(512)
         logging.debug(answer)
-        connection.close()
+        await close_stream(writer)
 
 
-    def __init__(self):
+    def __init__(self, resolver=None, sslcontext=None, endpoints=None):
         self._port = None
         self._ssl = None
         self._host = None
         self._hostname = None
-        DaneChecker.__init__(self)
+        self._endpoints = endpoints
+        DaneChecker.__init__(self, resolver, sslcontext)
 
 
     def set_args(self, args):
         DaneChecker.set_args(self, args)
 
-        sslcontext = SSLContext(PROTOCOL_TLSv1_2)
-        sslcontext.verify_mode = CERT_REQUIRED
-        sslcontext.load_verify_locations(args.castore)
-
-        cresolver = Resolver(args.ancor)
-        self._sslcontext = sslcontext
+        if self._sslcontext is None:
+            self._sslcontext = create_sslcontext(args.castore)
 
         self._hostname = args.Host.encode('idna').decode()
+
+
+    async def _lookup_endpoints(self):
+        """Returns the (endpoint, meta) tuples of all SRV records to check"""
+        lookups = []
+        if not self._args.s2s:
+            lookups.append(('client', "_xmpp-client._tcp.%s" % self._hostname))
+        if not self._args.c2s:
+            lookups.append(('server', "_xmpp-server._tcp.%s" % self._hostname))
+
+        results = await asyncio.gather(*[srv_lookup_async(name, self._resolver)
+                                         for _, name in lookups])
+
         endpoints = []
-        if not args.s2s:
-            for endpoint, meta in srv_lookup("_xmpp-client._tcp.%s" %
-                                             self._hostname,
-                                             cresolver):
-                meta['type'] = 'client'
-                endpoints.append((endpoint, meta))
-        if not args.c2s:
-            for endpoint, meta in srv_lookup("_xmpp-server._tcp.%s" %
-                                             self._hostname,
-                                             cresolver):
-                meta['type'] = 'server'
+        for (servicetype, _), srvrecords in zip(lookups, results):
+            for endpoint, meta in srvrecords:
+                meta['type'] = servicetype
                 endpoints.append((endpoint, meta))
+        return endpoints
 
-        self._endpoints = endpoints
+
+    async def check_async(self):
+        if self._endpoints is None:
+            self._endpoints = await self._lookup_endpoints()
+
+        return await DaneChecker.check_async(self)
 
 
     def generate_menu(self, argparser):
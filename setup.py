@@ -15,6 +15,12 @@ setup(name='DANE monitoring plugins',
               'check_dane_https = check_dane.https:main',
               'check_dane_smtp  = check_dane.smtp:main',
               'check_dane_xmpp  = check_dane.xmpp:main',
+              'check_dane_ssh   = check_dane.ssh:main',
+              'check_dnssec     = check_dane.dnssec:main',
+              'check_dane_fleet = check_dane.fleet:main',
+              'check_dane_exporter = check_dane.exporter:main',
+              'check_dane_domain = check_dane.domain:main',
+              'check_dane_history = check_dane.history:main',
           ],
       }
 )
@@ -0,0 +1,86 @@
+"""Local stand-ins for the DNS and TLS servers a check talks to"""
+
+import os
+import ssl
+import struct
+import hashlib
+import ipaddress
+from types import SimpleNamespace
+
+from check_dane.cert import get_spki
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CERTIFICATE = os.path.join(DATA, "localhost.pem")
+KEY = os.path.join(DATA, "localhost.key")
+
+RR_TYPE_A = 1
+RR_TYPE_TLSA = 52
+
+# an answer without records, carrying no signatures to parse
+EMPTY_PACKET = struct.pack("!HHHHHH", 0, 0x8180, 0, 0, 0, 0)
+
+
+class LocalResolver:
+    """Resolves every name to the given IPv4 addresses and serves a single
+       TLSA record"""
+    def __init__(self, tlsa, addresses=("127.0.0.1",)):
+        self._tlsa = tlsa
+        self._addresses = addresses
+
+
+    async def resolve(self, name, rrtype):
+        if rrtype == RR_TYPE_A:
+            data = [ipaddress.ip_address(address).packed for address in self._addresses]
+        elif rrtype == RR_TYPE_TLSA:
+            data = [self._tlsa]
+        else:
+            data = None
+
+        return 0, SimpleNamespace(data=None if data is None else SimpleNamespace(data=data),
+                                  ttl=3600, packet=EMPTY_PACKET)
+
+
+def tlsa_311():
+    with open(CERTIFICATE) as pemfile:
+        der = ssl.PEM_cert_to_DER_cert(pemfile.read())
+    return bytes([3, 1, 1]) + hashlib.sha256(get_spki(der)).digest()
+
+
+def server_context():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(CERTIFICATE, KEY)
+    return context
+
+
+async def serve_https(reader, writer):
+    try:
+        await reader.read(512)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        await writer.drain()
+        await reader.read(512)
+    except (OSError, ssl.SSLError):
+        pass
+    writer.close()
+
+
+async def serve_smtp(reader, writer):
+    writer.write(b"220 localhost ESMTP\r\n")
+    try:
+        while True:
+            command = (await reader.readline()).strip().upper()
+            if command == b"" or command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            elif command.startswith(b"EHLO"):
+                writer.write(b"250-localhost\r\n250 STARTTLS\r\n")
+            elif command == b"STARTTLS":
+                writer.write(b"220 Ready to start TLS\r\n")
+                await writer.drain()
+                await writer.start_tls(server_context())
+            else:
+                writer.write(b"502 Not implemented\r\n")
+    except (OSError, ssl.SSLError):
+        pass
+    writer.close()
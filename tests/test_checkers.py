@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("unbound")
+pytest.importorskip("ldns")
+pytest.importorskip("paramiko")
+pytest.importorskip("pyasn1_modules")
+
+from check_dane import abstract
+from check_dane.https import HttpsDaneChecker
+from check_dane.fleet import CHECKERS, Target, parse_target
+
+from standin import CERTIFICATE, LocalResolver, tlsa_311, server_context, serve_https
+
+
+def https_checker(port, options=[], addresses=("127.0.0.1",)):
+    checker = HttpsDaneChecker(LocalResolver(tlsa_311(), addresses))
+    checker.set_args(parse_target(Target('https', "localhost", port,
+                                         ["-4", "--castore", CERTIFICATE] + options, 'https')))
+    return checker
+
+
+def test_same_certificate_on_two_addresses(monkeypatch):
+    verified = []
+    def verify_certificate(cert, args):
+        verified.append(cert)
+        return 0
+    monkeypatch.setattr(abstract, "verify_certificate", verify_certificate)
+
+    async def run():
+        first = await asyncio.start_server(serve_https, "127.0.0.1", 0, ssl=server_context())
+        port = first.sockets[0].getsockname()[1]
+        second = await asyncio.start_server(serve_https, "127.0.0.2", port, ssl=server_context())
+
+        checker = https_checker(port, addresses=("127.0.0.1", "127.0.0.2"))
+        async with first, second:
+            return checker, port, await checker.check_async()
+
+    checker, port, status = asyncio.run(run())
+
+    assert status == 0
+    assert len(checker.certificates) == 1
+    certificate, = checker.certificates.values()
+    assert sorted(certificate.endpoints) == [("localhost", port, "127.0.0.1"),
+                                             ("localhost", port, "127.0.0.2")]
+    assert len(verified) == 1
+
+
+@pytest.mark.parametrize("protocol", ["https", "smtp", "xmpp"])
+def test_target_includes_family(protocol):
+    targets = set()
+    for family in ([], ["-4"], ["-6"]):
+        checker = CHECKERS[protocol](LocalResolver(tlsa_311()))
+        checker.set_args(parse_target(Target(protocol, "localhost", None,
+                                             ["--castore", CERTIFICATE] + family, protocol)))
+        targets.add(checker.target)
+
+    assert len(targets) == 3
+
+
+async def serve_nothing(reader, writer):
+    await reader.read()
+    writer.close()
+
+
+@pytest.mark.parametrize("silent", [False, True])
+def test_failing_address(caplog, silent):
+    async def run():
+        server = await asyncio.start_server(serve_https, "127.0.0.1", 0, ssl=server_context())
+        port = server.sockets[0].getsockname()[1]
+        # nothing listens on the second address unless it accepts silently
+        other = await asyncio.start_server(serve_nothing, "127.0.0.2", port if silent else 0)
+
+        checker = https_checker(port, ["--timeout=1"], addresses=("127.0.0.1", "127.0.0.2"))
+        async with server, other:
+            return checker, port, await checker.check_async()
+
+    checker, port, status = asyncio.run(run())
+
+    assert status == 2
+    certificate, = checker.certificates.values()
+    assert certificate.endpoints == [("localhost", port, "127.0.0.1")]
+    assert "via 127.0.0.2" in caplog.text
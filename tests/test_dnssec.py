@@ -0,0 +1,114 @@
+import struct
+import base64
+import argparse
+from hashlib import sha256
+from calendar import timegm
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("unbound")
+pytest.importorskip("ldns")
+
+from check_dane.dnssec import _keytag, check_ds_delegation
+from check_dane.resolve import dnssec_verify_rrsig_validity
+
+
+RR_TYPE_SOA = 6
+RR_TYPE_DS = 43
+RR_TYPE_RRSIG = 46
+RR_TYPE_DNSKEY = 48
+
+
+def wire_name(name):
+    return b"".join(struct.pack("B", len(label)) + label.encode()
+                    for label in name.split(".")) + b"\x00"
+
+
+def signed_answer(name, rrtype, rdata, inception, expiration):
+    packet = struct.pack("!HHHHHH", 0, 0x8180, 1, 2, 0, 0)
+    packet += wire_name(name) + struct.pack("!HH", rrtype, 1)
+    packet += struct.pack("!HHHIH", 0xc00c, rrtype, 1, 3600, len(rdata)) + rdata
+
+    signature = struct.pack("!HBBIIIH", rrtype, 13, name.count(".") + 1, 3600,
+                            timegm(expiration.utctimetuple()),
+                            timegm(inception.utctimetuple()), 12345)
+    signature += wire_name(name) + bytes(64)
+    packet += struct.pack("!HHHIH", 0xc00c, RR_TYPE_RRSIG, 1, 3600, len(signature)) + signature
+    return packet
+
+
+SOA = wire_name("ns.example.org") + wire_name("hostmaster.example.org") + bytes(20)
+
+
+@pytest.mark.parametrize("days,status", [(60, 0), (20, 1), (3, 2), (-1, 2)])
+def test_rrsig_validity(days, status):
+    now = datetime.utcnow()
+    packet = signed_answer("example.org", RR_TYPE_SOA, SOA, now - timedelta(days=10),
+                           now + timedelta(days=days, hours=12))
+
+    assert dnssec_verify_rrsig_validity(packet, 30, 7) == status
+
+
+def test_rrsig_not_yet_valid():
+    now = datetime.utcnow()
+    packet = signed_answer("example.org", RR_TYPE_SOA, SOA, now + timedelta(days=1),
+                           now + timedelta(days=30))
+
+    assert dnssec_verify_rrsig_validity(packet) == 2
+
+
+# RFC 4034 section 5.4, key id 60485
+RFC4034_DNSKEY = struct.pack("!HBB", 256, 3, 5) + base64.b64decode(
+    "AQOeiiR0GOMYkDshWoSKz9XzfwJr1AYtsmx3TGkJaNXVbfi/2pHm822aJ5iI9BMzNXxeYCmZ"
+    "DRD99WYwYqUSdjMmmAphXdvxegXd/M5+X7OrzKBaMbCVdFLUUh6DhweJBjEVv5f2wwjM9Xzc"
+    "nOf+EPbtG9DMBmADjFDc2w/rljwvFw==")
+
+
+def test_keytag_rfc4034():
+    assert _keytag(RFC4034_DNSKEY) == 60485
+
+
+def test_keytag_odd_length():
+    assert _keytag(bytes([1, 0, 3, 8, 0xab])) == (0x0100 + 0x0308 + 0xab00) & 0xFFFF
+
+
+def test_keytag_rsamd5():
+    # RFC 4034 appendix B.1: bits 8 to 23 of the least significant bits
+    # of the modulus
+    assert _keytag(struct.pack("!HBB", 256, 3, 1) + bytes(60) + bytes([0x12, 0x34, 0x56])) == 0x1234
+
+
+class ZoneResolver:
+    def __init__(self, answers):
+        self._answers = answers
+
+
+    def resolve(self, name, rrtype, secure=False):
+        return SimpleNamespace(data=SimpleNamespace(data=self._answers[rrtype]))
+
+
+KSK = struct.pack("!HBB", 257, 3, 13) + bytes(range(64))
+
+
+def ds_record(zone, dnskey, digest=None):
+    if digest is None:
+        digest = sha256(wire_name(zone) + dnskey).digest()
+    return struct.pack("!HBB", _keytag(dnskey), 13, 2) + digest
+
+
+def test_ds_delegation_matches():
+    resolver = ZoneResolver({RR_TYPE_DS: [ds_record("example.org", KSK)], RR_TYPE_DNSKEY: [KSK]})
+    assert check_ds_delegation(resolver, "Example.Org.", argparse.Namespace()) == 0
+
+
+def test_ds_delegation_mismatch():
+    resolver = ZoneResolver({RR_TYPE_DS: [ds_record("example.org", KSK, bytes(32))],
+                             RR_TYPE_DNSKEY: [KSK]})
+    assert check_ds_delegation(resolver, "example.org", argparse.Namespace()) == 2
+
+
+def test_ds_delegation_missing():
+    resolver = ZoneResolver({RR_TYPE_DS: [], RR_TYPE_DNSKEY: [KSK]})
+    assert check_ds_delegation(resolver, "example.org", argparse.Namespace()) == 1
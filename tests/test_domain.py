@@ -0,0 +1,65 @@
+import argparse
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("unbound")
+pytest.importorskip("ldns")
+pytest.importorskip("paramiko")
+pytest.importorskip("pyasn1_modules")
+
+from check_dane.domain import SERVICES, DomainChecker, service_options
+from check_dane.fleet import Target, parse_target
+
+from standin import CERTIFICATE
+
+
+# the root zone KSK-2017, only parsed, the tests don't leave the host
+ROOT_ANCHOR = (". IN DS 20326 8 2 "
+               "E06D44B80B8F1D39A95C0B0D7C65D08458E880409BBC683457104237C7F8EC8D\n")
+
+PORTS = {'https': 443, 'smtp': 25, 'xmpp': None, 'ssh': 22, 'dnssec': None}
+
+
+def domain_args(**changes):
+    values = dict(ancor="/usr/share/dns/root.key", castore="/etc/ssl/certs/ca-certificates.crt",
+                  use4=False, use6=False, warndays=-1, critdays=-1)
+    values.update(changes)
+    return argparse.Namespace(**values)
+
+
+@pytest.mark.parametrize("protocol", SERVICES)
+@pytest.mark.parametrize("changes", [dict(), dict(use4=True, warndays=30, critdays=7),
+                                     dict(use6=True)])
+def test_service_options_parse(protocol, changes):
+    args = domain_args(**changes)
+    target = Target(protocol, "example.org", PORTS[protocol],
+                    service_options(protocol, args), protocol)
+
+    parsed = parse_target(target)
+
+    assert parsed.ancor == args.ancor
+    if protocol != 'ssh':
+        assert parsed.warndays == args.warndays
+        assert parsed.critdays == args.critdays
+    if protocol in ('https', 'smtp', 'xmpp'):
+        assert parsed.castore == args.castore
+        assert parsed.use4 == args.use4
+        assert parsed.use6 == args.use6
+
+
+class FailingResolver:
+    async def resolve(self, name, rrtype):
+        # SERVFAIL
+        return 2, SimpleNamespace(data=None)
+
+
+def test_discovery_fails(tmp_path, caplog):
+    ancor = tmp_path / "root.key"
+    ancor.write_text(ROOT_ANCHOR)
+    checker = DomainChecker(domain_args(Domain="example.org", services=['smtp', 'xmpp'],
+                                        ancor=str(ancor), castore=CERTIFICATE))
+    checker._resolver = FailingResolver()
+
+    assert checker.check() == 3
+    assert "Looking up the services of example.org failed" in caplog.text
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("unbound")
+pytest.importorskip("ldns")
+pytest.importorskip("paramiko")
+pytest.importorskip("pyasn1_modules")
+
+from check_dane.exporter import MetricsCache, Refresher
+from check_dane.fleet import Target
+
+from standin import CERTIFICATE, LocalResolver, tlsa_311, server_context, serve_https, serve_smtp
+
+
+def test_render():
+    cache = MetricsCache()
+    cache.update((('host', 'a"b'), ('port', 443)),
+                 [('dane_check_status', (), 1),
+                  ('dane_check_duration_seconds', (('phase', 'dns'),), 0.5)])
+    cache.render()
+
+    lines = cache.body.decode().splitlines()
+    assert '# TYPE dane_check_status gauge' in lines
+    assert 'dane_check_status{host="a\\"b",port="443"} 1.0' in lines
+    assert 'dane_check_duration_seconds{host="a\\"b",port="443",phase="dns"} 0.5' in lines
+    assert not any(line.startswith("dane_tlsa_match") for line in lines)
+
+
+def test_render_only_when_updated():
+    cache = MetricsCache()
+    cache.update((('host', 'a'),), [('dane_check_status', (), 0)])
+    cache.render()
+    body = cache.body
+
+    cache.render()
+    assert cache.body is body
+
+    cache.update((('host', 'a'),), [('dane_check_status', (), 2)])
+    cache.render()
+    assert b'dane_check_status{host="a"} 2.0' in cache.body
+
+
+def refresh(monkeypatch, protocol, options=[], tlsa=None, listening=True):
+    """Runs one refresh of a target served by a local stand-in server and
+       returns the rendered metrics. Without listening the server is gone
+       before the check connects"""
+    cache = MetricsCache()
+    resolver = LocalResolver(tlsa or tlsa_311())
+
+    async def run():
+        if protocol == 'https':
+            server = await asyncio.start_server(serve_https, "127.0.0.1", 0, ssl=server_context())
+        else:
+            server = await asyncio.start_server(serve_smtp, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        target = Target(protocol, "localhost", port, ["-4", "--castore", CERTIFICATE] + options,
+                        "dane_%s" % protocol)
+        refresher = Refresher([target], cache, 300, 1, 30)
+        monkeypatch.setattr(refresher, "_resolver", lambda ancor: resolver)
+
+        if not listening:
+            server.close()
+            await server.wait_closed()
+
+        async with server:
+            await refresher.refresh(target)
+        return port
+
+    port = asyncio.run(run())
+    cache.render()
+
+    labels = 'protocol="%s",host="localhost",port="%d",service="dane_%s"' % (protocol, port,
+                                                                               protocol)
+    samples = dict()
+    for line in cache.body.decode().splitlines():
+        if not line.startswith("#") and "{%s" % labels in line:
+            name, value = line.split(" ")
+            samples[name.replace(labels, "").replace("{,", "{").replace("{}", "")] = float(value)
+    return samples
+
+
+@pytest.mark.parametrize("protocol", ["https", "smtp"])
+def test_refresh(monkeypatch, protocol):
+    samples = refresh(monkeypatch, protocol)
+
+    assert samples['dane_check_status'] == 0
+    assert samples['dane_tlsa_match'] == 1
+    assert samples['dane_tlsa_unused_records'] == 0
+    assert samples['dane_certificate_expiry_timestamp_seconds'] > 0
+    assert 'dane_check_duration_seconds{phase="handshake"}' in samples
+
+
+@pytest.mark.parametrize("protocol", ["https", "smtp"])
+def test_refresh_mismatch(monkeypatch, protocol):
+    samples = refresh(monkeypatch, protocol, tlsa=bytes([3, 1, 1]) + bytes(32))
+
+    assert samples['dane_check_status'] == 2
+    assert samples['dane_tlsa_match'] == 0
+    assert samples['dane_tlsa_unused_records'] == 1
+
+
+def test_refresh_expiry_warning(monkeypatch):
+    # the stand-in certificate is valid for 30 years
+    samples = refresh(monkeypatch, "https", ["--warndays=20000"])
+
+    assert samples['dane_check_status'] == 1
+    assert samples['dane_tlsa_match'] == 1
+
+
+def test_refresh_unreachable(monkeypatch):
+    samples = refresh(monkeypatch, "https", listening=False)
+
+    assert samples['dane_check_status'] == 2
+    assert samples['dane_tlsa_match'] == 0
+    assert 'dane_certificate_expiry_timestamp_seconds' not in samples
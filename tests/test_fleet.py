@@ -0,0 +1,57 @@
+import os
+import time
+import logging
+
+import pytest
+
+pytest.importorskip("unbound")
+pytest.importorskip("ldns")
+
+from check_dane import fleet
+from check_dane.fleet import Target, Result, run_fleet
+
+
+def check(target, timeout=None):
+    if target.host == "dead.example":
+        os._exit(1)
+    elif target.host == "hung.example":
+        # blocking, the worker can't cancel the check itself
+        time.sleep(60)
+    return Result(target, 0, [], time.time(), 0)
+
+
+def test_run_fleet_dead_worker(monkeypatch):
+    monkeypatch.setattr(fleet, "run_target", check)
+    targets = [Target('https', host, 443, [], 'https')
+               for host in ["a.example", "dead.example", "b.example"]]
+
+    results = []
+    run_fleet(targets, 2, 1, logging.WARNING, results.append, timeout=2)
+
+    statuses = {result.target.host: result.status for result in results}
+    assert statuses == {"a.example": 0, "dead.example": 3, "b.example": 0}
+
+
+def test_run_fleet_per_host(monkeypatch):
+    monkeypatch.setattr(fleet, "run_target", check)
+    targets = [Target('https', "a.example", port, [], 'https') for port in range(443, 448)]
+
+    results = []
+    run_fleet(targets, 4, 2, logging.WARNING, results.append)
+
+    assert sorted(result.target.port for result in results) == list(range(443, 448))
+
+
+def test_run_fleet_hung_worker(monkeypatch):
+    monkeypatch.setattr(fleet, "run_target", check)
+    targets = [Target('https', host, 443, [], 'https')
+               for host in ["hung.example", "a.example", "b.example"]]
+
+    results = []
+    start = time.time()
+    run_fleet(targets, 1, 1, logging.WARNING, results.append, timeout=1)
+
+    # the checks queued behind the hung one get their own full timeout
+    statuses = {result.target.host: result.status for result in results}
+    assert statuses == {"hung.example": 3, "a.example": 0, "b.example": 0}
+    assert time.time() - start < 30
@@ -0,0 +1,139 @@
+import os
+from multiprocessing import Pool
+
+import pytest
+
+from check_dane.history import History, MAGIC, HEADER, RECORD, MISSING
+from check_dane.history import load, load_targets, summarize, target_id, certificates_digest
+
+
+DAY = 86400
+NOW = 1e9
+
+
+def append_many(path, worker, count=50):
+    history = History(path)
+    for i in range(count):
+        history.append("HttpsDaneChecker host%d.example:443" % worker, 0,
+                       NOW + 90 * DAY, NOW + 14 * DAY, [b"a" * 32], NOW + i)
+
+
+def test_append_creates_header(tmp_path):
+    path = str(tmp_path / "history")
+    append_many(path, 0, 1)
+
+    with open(path, "rb") as historyfile:
+        assert historyfile.read(HEADER) == MAGIC.ljust(HEADER, b"\0")
+    assert os.path.getsize(path) == HEADER + RECORD.size
+    assert sorted(os.listdir(str(tmp_path))) == ["history", "history.targets"]
+
+
+def test_concurrent_appenders(tmp_path):
+    path = str(tmp_path / "history")
+    with Pool(8) as pool:
+        pool.starmap(append_many, [(path, worker) for worker in range(8)])
+
+    with open(path, "rb") as historyfile:
+        assert historyfile.read(HEADER) == MAGIC.ljust(HEADER, b"\0")
+    assert os.path.getsize(path) == HEADER + 8 * 50 * RECORD.size
+
+
+def test_target_index(tmp_path):
+    path = str(tmp_path / "history")
+    history = History(path)
+    for i in range(3):
+        history.append("SmtpDaneChecker mx.example:25", 0, None, None, [], NOW + i)
+    History(path).append("SmtpDaneChecker mx.example:465 ssl", 0, None, None, [], NOW)
+    History(path).append("SmtpDaneChecker mx.example:25", 0, None, None, [], NOW)
+
+    assert load_targets(path) == {
+        target_id("SmtpDaneChecker mx.example:25"): "SmtpDaneChecker mx.example:25",
+        target_id("SmtpDaneChecker mx.example:465 ssl"): "SmtpDaneChecker mx.example:465 ssl",
+    }
+    with open(path + ".targets") as indexfile:
+        assert len(indexfile.readlines()) == 2
+
+
+def test_certificates_digest():
+    assert certificates_digest([b"a" * 32, b"b" * 32]) == certificates_digest([b"b" * 32, b"a" * 32])
+    assert certificates_digest([b"a" * 32]) != certificates_digest([b"a" * 32, b"b" * 32])
+    assert certificates_digest([]) == b""
+
+
+def test_summarize(tmp_path):
+    pytest.importorskip("numpy")
+    path = str(tmp_path / "history")
+    history = History(path)
+
+    rsa, ecdsa, renewed = b"r" * 32, b"e" * 32, b"n" * 32
+    web = "HttpsDaneChecker www.example:443"
+    observations = [
+        # dual algorithm certificates seen in either order are no rotation
+        (web, [rsa, ecdsa], 40),
+        (web, [ecdsa, rsa], 35),
+        (web, [renewed, ecdsa], 30),
+        (web, [renewed, ecdsa], 90),
+    ]
+    for day, (target, fingerprints, certdays) in enumerate(observations):
+        now = NOW + day * DAY
+        history.append(target, 0, now + certdays * DAY + 60, None, fingerprints, now)
+
+    mail = "SmtpDaneChecker mx.example:25"
+    later = NOW + DAY / 2
+    history.append(mail, 2, later + 10 * DAY + 60, later + 5 * DAY + 60, [rsa], later)
+    history.append(mail, 1, NOW + 9 * DAY + 60, NOW + 6 * DAY + 60, [rsa], NOW)
+
+    records = load(path)
+    assert len(records) == 6
+
+    summary, before, after = summarize(records)
+    index = {tid: i for i, tid in enumerate(summary['target'])}
+    w, m = index[target_id(web)], index[target_id(mail)]
+
+    assert summary['observations'][w] == 4
+    assert summary['certdays'][w] == 90
+    assert summary['mincertdays'][w] == 30
+    assert summary['rrsigdays'][w] == MISSING
+    assert summary['rotations'][w] == 1
+    assert summary['rotationmargin'][w] == 35
+
+    # the last observation is the latest, not the last appended one
+    assert summary['status'][m] == 2
+    assert summary['certdays'][m] == 10
+    assert summary['mincertdays'][m] == 9
+    assert summary['minrrsigdays'][m] == 5
+    assert summary['rotations'][m] == 0
+
+    assert len(before) == len(after) == 1
+    assert before[0]['fingerprint'] == certificates_digest([rsa, ecdsa])
+    assert after[0]['fingerprint'] == certificates_digest([renewed, ecdsa])
+    assert after[0]['target'] == target_id(web)
+
+
+def test_summarize_failed_observation(tmp_path):
+    pytest.importorskip("numpy")
+    path = str(tmp_path / "history")
+    history = History(path)
+
+    old, renewed = b"o" * 32, b"n" * 32
+    same = "HttpsDaneChecker same.example:443"
+    rotated = "HttpsDaneChecker rotated.example:443"
+    observations = [(same, [old]), (same, []), (same, [old]),
+                    (rotated, [old]), (rotated, []), (rotated, [renewed])]
+    for day, (target, fingerprints) in enumerate(observations):
+        now = NOW + day * DAY
+        if fingerprints:
+            history.append(target, 0, now + 20 * DAY + 60, None, fingerprints, now)
+        else:
+            history.append(target, 2, None, None, fingerprints, now)
+
+    summary, before, after = summarize(load(path))
+    index = {tid: i for i, tid in enumerate(summary['target'])}
+    s, r = index[target_id(same)], index[target_id(rotated)]
+
+    # a check without certificate neither ends nor starts a certificate
+    assert summary['rotations'][s] == 0
+    assert summary['rotations'][r] == 1
+    assert summary['rotationmargin'][r] == 20
+    assert before[0]['fingerprint'] == certificates_digest([old])
+    assert after[0]['fingerprint'] == certificates_digest([renewed])
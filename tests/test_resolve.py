@@ -0,0 +1,51 @@
+import asyncio
+from socket import AF_INET, AF_INET6
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("unbound")
+
+from check_dane import resolve
+from check_dane.resolve import address_lookup_async, rrsig_expiration, ResolverException
+
+
+RR_TYPE_A = 1
+RR_TYPE_AAAA = 28
+
+
+class StaticResolver:
+    def __init__(self, answers, status=0):
+        self._answers = answers
+        self._status = status
+        self.queries = []
+
+
+    async def resolve(self, name, rrtype):
+        self.queries.append((name, rrtype))
+        data = self._answers.get((name, rrtype))
+        return self._status, SimpleNamespace(data=None if data is None
+                                             else SimpleNamespace(data=data))
+
+
+def test_address_lookup():
+    resolver = StaticResolver({
+        ("mx.example.org", RR_TYPE_A): [bytes([192, 0, 2, 1]), bytes([192, 0, 2, 2])],
+        ("mx.example.org", RR_TYPE_AAAA): [bytes.fromhex("20010db8000000000000000000000001")],
+    })
+
+    assert asyncio.run(address_lookup_async("mx.example.org", AF_INET, resolver)) == \
+        ["192.0.2.1", "192.0.2.2"]
+    assert asyncio.run(address_lookup_async("mx.example.org", AF_INET6, resolver)) == \
+        ["2001:db8:0:0:0:0:0:1"]
+    assert asyncio.run(address_lookup_async("www.example.org", AF_INET, resolver)) == []
+
+
+def test_address_lookup_failure():
+    with pytest.raises(ResolverException):
+        asyncio.run(address_lookup_async("mx.example.org", AF_INET, StaticResolver({}, 2)))
+
+
+def test_rrsig_expiration_without_ldns(monkeypatch):
+    monkeypatch.setattr(resolve, "ldns_wire2pkt", None)
+    assert rrsig_expiration(bytes(12)) is None
@@ -0,0 +1,90 @@
+import sqlite3
+
+from check_dane.schedule import Scheduler, CheckState
+
+
+DAY = 86400
+NOW = 1e9
+
+
+def state(**changes):
+    values = dict(status=0, checked=NOW, tlsa_hash="abc", tlsa_ttl=3600, fingerprints=[],
+                  cert_expire=NOW + 90 * DAY, rrsig_expire=NOW + 60 * DAY, tlsa_checked=NOW)
+    values.update(changes)
+    return CheckState(**values)
+
+
+def scheduler(tmp_path, mininterval=300, maxinterval=DAY, warndays=30, critdays=7):
+    return Scheduler(str(tmp_path / "state.db"), mininterval, maxinterval, warndays, critdays)
+
+
+def test_next_check_max_interval(tmp_path):
+    assert scheduler(tmp_path).next_check(state()) == NOW + DAY
+
+
+def test_next_check_ignores_tlsa_ttl(tmp_path):
+    assert scheduler(tmp_path).next_check(state(tlsa_ttl=300)) == NOW + DAY
+
+
+def test_next_check_failed(tmp_path):
+    assert scheduler(tmp_path).next_check(state(status=2)) == NOW + 300
+
+
+def test_next_check_warning_threshold(tmp_path):
+    # certificate crosses the 30 day warning threshold in 12 hours
+    sched = scheduler(tmp_path)
+    assert sched.next_check(state(cert_expire=NOW + 30 * DAY + DAY / 2)) == NOW + DAY / 2
+
+
+def test_next_check_critical_threshold(tmp_path):
+    # already warning, the signature crosses the 7 day error threshold in 2 hours
+    sched = scheduler(tmp_path)
+    assert sched.next_check(state(rrsig_expire=NOW + 7 * DAY + 7200)) == NOW + 7200
+
+
+def test_next_check_min_interval(tmp_path):
+    sched = scheduler(tmp_path)
+    assert sched.next_check(state(cert_expire=NOW + 30 * DAY + 10)) == NOW + 300
+
+
+def test_next_tlsa_check(tmp_path):
+    sched = scheduler(tmp_path)
+    assert sched.next_tlsa_check(state(tlsa_checked=NOW + 100)) == NOW + 3700
+    assert sched.next_tlsa_check(state(tlsa_ttl=None)) is None
+
+
+def test_due(tmp_path):
+    sched = scheduler(tmp_path)
+    assert sched.due("target", NOW)
+    assert sched.tlsa_due("target", NOW)
+
+    sched.update("target", state())
+    assert not sched.due("target", NOW + 3600)
+    assert not sched.tlsa_due("target", NOW + 3599)
+    assert sched.tlsa_due("target", NOW + 3600)
+    assert sched.due("target", NOW + DAY)
+
+
+def test_update_persists(tmp_path):
+    scheduler(tmp_path).update("target", state())
+    assert scheduler(tmp_path).lookup("target") == state()
+
+
+def test_update_keeps_other_targets(tmp_path):
+    # both schedulers are open at the same time as in concurrent checks
+    first, second = scheduler(tmp_path), scheduler(tmp_path)
+    first.update("first", state())
+    second.update("second", state(status=1))
+
+    assert scheduler(tmp_path).lookup("first") == state()
+    assert scheduler(tmp_path).lookup("second") == state(status=1)
+
+
+def test_unreadable_state(tmp_path):
+    scheduler(tmp_path)
+    with sqlite3.connect(str(tmp_path / "state.db")) as db:
+        db.execute("INSERT INTO states (target, state) VALUES ('target', '{')")
+
+    sched = scheduler(tmp_path)
+    assert sched.lookup("target") is None
+    assert sched.due("target", NOW)
@@ -0,0 +1,54 @@
+import hashlib
+import argparse
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("unbound")
+pytest.importorskip("paramiko")
+
+from check_dane.ssh import HostKeyLookup, HostKeyMatchSSHFP, HostKeyMismatchSSHFP
+
+
+HOSTKEY = b"\x00\x00\x00\x0bssh-ed25519" + bytes(36)
+
+
+class SSHFPResolver:
+    def __init__(self, records):
+        self._records = records
+        self.queries = []
+
+
+    def resolve(self, name, rrtype):
+        self.queries.append(name)
+        return 0, SimpleNamespace(data=SimpleNamespace(data=self._records))
+
+
+class HostKey:
+    def asbytes(self):
+        return HOSTKEY
+
+
+    def get_name(self):
+        return "ssh-ed25519"
+
+
+def lookup(records):
+    resolver = SSHFPResolver(records)
+    args = argparse.Namespace(Host="ssh.example.org", port=2222, ancor=None)
+    return resolver, HostKeyLookup(args, resolver)
+
+
+def test_sshfp_match_on_other_port():
+    resolver, policy = lookup([bytes([4, 2]) + hashlib.sha256(HOSTKEY).digest()])
+
+    with pytest.raises(HostKeyMatchSSHFP):
+        policy.missing_host_key(None, "[ssh.example.org]:2222", HostKey())
+    assert resolver.queries == ["ssh.example.org"]
+
+
+def test_sshfp_mismatch():
+    resolver, policy = lookup([bytes([4, 2]) + bytes(32)])
+
+    with pytest.raises(HostKeyMismatchSSHFP):
+        policy.missing_host_key(None, "[ssh.example.org]:2222", HostKey())